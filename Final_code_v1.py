@@ -16,8 +16,32 @@ import gc
 import sys
 from tqdm.contrib.concurrent import thread_map
 from multiprocessing import Pool, Manager
-from itertools import islice
+from itertools import islice, combinations
+from functools import partial, wraps
 import copy
+import bisect
+import hashlib
+import math
+import pickle
+import shutil
+import tempfile
+import time
+import ast
+import operator
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # Optional, only needed for [compare] engine = arrow
+    pa = pc = pa_csv = None
+try:
+    import polars as pl
+except ImportError:  # Optional, only needed for [compare] engine = polars
+    pl = None
+try:
+    import duckdb
+except ImportError:  # Optional, only needed for [compare] engine = duckdb
+    duckdb = None
 
 '''-----------------------------------
 Setup Logging
@@ -68,6 +92,76 @@ csv_columns = config['keys']['columns']
 
 csv_primary_keys = [col.strip() for col in csv_primary_keys.split(',')] if csv_primary_keys else []
 csv_columns = [col.strip() for col in csv_columns.split(',')] if csv_columns else None
+use_key_hashing = config.getboolean('keys', 'key_hashing', fallback=False)  # uint64 key hashes instead of a MultiIndex
+row_filter = config.get('keys', 'row_filter', raw=True, fallback='').strip()  # Load only rows meeting this condition over `columns`, e.g. `Sellable Status` == "ACTIVE"
+
+# [column_profiles] name = columns; all profiles share one read and key alignment, each gets its own summary and report
+column_profiles = {name: [col.strip() for col in value.split(',') if col.strip()]
+                   for name, value in config['column_profiles'].items()} if config.has_section('column_profiles') else {}
+if column_profiles:
+    # Read and compare only the keys and the union of the profiles
+    csv_columns = list(dict.fromkeys(csv_primary_keys + [col for cols in column_profiles.values() for col in cols]))
+
+# [consistency_rules] name = expression [when condition] over `columns`, checked within each side's rows
+consistency_tolerance = config.getfloat('consistency_rules', 'tolerance', fallback=0.01)  # Allowed difference for == rules
+consistency_rules = {name: rule for name, rule in config.items('consistency_rules', raw=True)  # raw: % is modulo
+                     if name != 'tolerance'} if config.has_section('consistency_rules') else {}
+RULE_COLUMN_PATTERN = re.compile(r'`([^`]+)`')  # Backtick-quoted column names in a rule or the row filter
+if csv_columns:
+    # Columns of the row filter and the rules are read even when [keys] columns leaves them out
+    rule_columns = RULE_COLUMN_PATTERN.findall(' '.join([row_filter, *consistency_rules.values()]))
+    csv_columns += [col for col in dict.fromkeys(rule_columns) if col not in csv_columns]
+
+# [compare]
+row_hash_fast_path = config.getboolean('compare', 'row_hash_fast_path', fallback=False)  # Cell compare only rows whose hashes differ
+summary_only = config.getboolean('compare', 'summary_only', fallback=False)  # Keep counters and per-column tallies, no diff records
+sorted_merge = config.getboolean('compare', 'sorted_merge', fallback=False)  # Merge-join inputs already sorted by primary key
+stream_batch_rows = config.getint('compare', 'stream_batch_rows', fallback=100000)  # Common rows compared per streamed diff batch
+max_diff_records = config.getint('compare', 'max_diff_records', fallback=0)  # Detailed diff records kept per file, 0 = unlimited
+max_diff_records_per_column = config.getint('compare', 'max_diff_records_per_column', fallback=0)  # Mismatch records kept per column, 0 = unlimited
+diff_sample_size = config.getint('compare', 'diff_sample_size', fallback=1000)  # Uniform sample kept of the records past the budget
+compare_engine = config.get('compare', 'engine', fallback='pandas').strip().lower()  # pandas | arrow | polars | duckdb
+if compare_engine == 'arrow' and pa is None:
+    raise ImportError("[compare] engine = arrow needs the pyarrow package")
+if compare_engine == 'polars' and pl is None:
+    raise ImportError("[compare] engine = polars needs the polars package")
+if compare_engine == 'duckdb' and duckdb is None:
+    raise ImportError("[compare] engine = duckdb needs the duckdb package")
+
+# [tolerance] column = absolute, relative; an absolute of 'cur' means half a minor unit of the row's currency
+tolerance_currency_column = config.get('tolerance', 'currency_column', fallback='CUR')
+column_tolerances = {}
+if config.has_section('tolerance'):
+    for col, value in config['tolerance'].items():
+        if col == 'currency_column':
+            continue
+        parts = [part.strip() for part in value.split(',')]
+        atol = parts[0].lower() if parts[0].lower() == 'cur' else float(parts[0] or 0)
+        rtol = float(parts[1]) if len(parts) > 1 and parts[1] else 0.0
+        column_tolerances[col] = (atol, rtol)  # configparser lowercases column names
+
+# [rekey] pair missing and extra rows whose key changed, blocking on stable key parts
+rekey_enabled = config.getboolean('rekey', 'enabled', fallback=False)
+rekey_blocking_columns = [col.strip() for col in config.get('rekey', 'blocking_columns', fallback='CXR,ORIG,DEST,TRF,CUR').split(',') if col.strip()]
+rekey_min_similarity = config.getfloat('rekey', 'min_similarity', fallback=0.9)  # Share of the other columns that must be equal
+rekey_max_block_pairs = config.getint('rekey', 'max_block_pairs', fallback=10000)  # Larger blocks are not scored
+
+# [key_discovery] profile sample files and suggest a smaller primary key instead of comparing
+key_discovery = config.getboolean('key_discovery', 'enabled', fallback=False)
+key_discovery_sample_files = config.getint('key_discovery', 'sample_files', fallback=4)  # CSV pairs profiled and verified
+key_discovery_sample_rows = config.getint('key_discovery', 'sample_rows', fallback=50000)  # Rows per pair used by the search
+key_discovery_exhaustive_size = config.getint('key_discovery', 'exhaustive_size', fallback=3)  # Subsets up to this size are all tried
+
+# [parsers] column = ddmmmyy | money | time_window | day_mask | fare_class
+column_parsers = {col: name.strip().lower() for col, name in config['parsers'].items()} if config.has_section('parsers') else {}
+
+# ISO 4217 minor units that differ from the usual 2 decimals
+DEFAULT_CURRENCY_DECIMALS = 2
+CURRENCY_DECIMALS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0, 'PYG': 0,
+    'RWF': 0, 'UGX': 0, 'UYI': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3
+}
 
 # [aws]
 bucket_name = config['aws']['bucket_name']
@@ -79,6 +173,15 @@ use_multithreading_reading = config.getboolean('threading', 'use_multithreading_
 use_multithreading_comparision = config.getboolean('threading', 'use_multithreading_comparision')
 num_processes = config.getint('threading', 'num_processes', fallback=4)  # Default to 4 processes
 comparison_batch_size = config.getint('threading', 'comparison_batch_size', fallback=50)  # Default batch size
+partition_rows = config.getint('threading', 'partition_rows', fallback=0)  # Split pairs with this many rows by key hash, 0 = never
+num_partitions = config.getint('threading', 'num_partitions', fallback=0) or num_processes  # Key partitions per large pair
+column_threads = config.getint('threading', 'column_threads', fallback=0)  # Threads comparing the columns of one pair, 0 = sequential; string columns hold the GIL, so only wide numeric files gain
+
+# [out_of_core] grace-hash comparison through on-disk partitions for pairs larger than RAM
+out_of_core = config.getboolean('out_of_core', 'enabled', fallback=False)
+memory_budget_mb = config.getint('out_of_core', 'memory_budget_mb', fallback=2048)  # Target peak memory per CSV pair, also DuckDB's memory_limit
+read_chunk_rows = config.getint('out_of_core', 'chunk_rows', fallback=100000)  # Rows read from a CSV per chunk
+spill_dir = config.get('out_of_core', 'spill_dir', fallback='') or None  # Partition and DuckDB spill files location, default system temp
 
 # [report_custom]
 include_passed = config.getboolean('report_custom', 'include_passed')
@@ -125,6 +228,26 @@ def process_csv_pair(args):
         logging.error(f"Error comparing {normalized_csv_name}: {e}")
         return normalized_csv_name, pd.DataFrame(), {'Status': 'ERROR', 'Note': str(e)}
     
+def process_csv_partition(args):
+    """Compare one key partition of a large CSV pair."""
+    normalized_csv_name, part, num_partitions, df1, df2, original_rows = args
+    try:
+        diff_df, summary = compare_csvs(df1, df2, normalized_csv_name,
+                                        original_rows=original_rows, partitions=num_partitions)
+        return normalized_csv_name, part, diff_df, summary
+    except Exception as e:
+        thread_safe_print(f"❌ Error comparing {normalized_csv_name} partition {part}: {e}")
+        logging.error(f"Error comparing {normalized_csv_name} partition {part}: {e}")
+        return normalized_csv_name, part, pd.DataFrame(), {'Status': 'ERROR', 'Note': str(e)}
+
+def process_comparison_task(task):
+    """Pool entry point: a whole CSV pair or one key partition of a large pair."""
+    kind, args = task
+    if kind == 'partition':
+        return process_csv_partition(args)
+    normalized_csv_name, diff_df, summary = process_csv_pair(args)
+    return normalized_csv_name, None, diff_df, summary
+
 def is_numeric(val):
     try:
         float(val)
@@ -159,6 +282,151 @@ def values_equal(val1, val2):
         return False
     return val1 == val2
 
+def normalize_uniques(uniques, memo):
+    """Run normalize_value once per distinct value, reusing results from memo"""
+    normalized = np.empty(len(uniques), dtype=object)
+    for i, val in enumerate(uniques):
+        try:
+            normalized[i] = memo[val]
+        except KeyError:
+            normalized[i] = memo[val] = normalize_value(val)
+        except TypeError:
+            normalized[i] = normalize_value(val)
+    return normalized
+
+def factorize_normalized(values1, values2, memo=None):
+    """Factorize both sides together and normalize only the unique values.
+
+    Returns integer codes for each side in which equal codes mean equal
+    normalized values and -1 marks a null, so comparing the two sides is a
+    plain integer comparison.
+    """
+    memo = {} if memo is None else memo
+    raw_codes, uniques = pd.factorize(np.concatenate([values1.astype(object), values2.astype(object)]))
+    norm_codes, _ = pd.factorize(normalize_uniques(uniques, memo))
+    codes = np.append(norm_codes, -1)[raw_codes]
+    return codes[:len(values1)], codes[len(values1):]
+
+def values_equal_array(values1, values2, memo=None):
+    """Vectorized values_equal, returns a boolean equality mask"""
+    values1 = np.asarray(values1)
+    values2 = np.asarray(values2)
+    if values1.dtype.kind in 'biuf' and values2.dtype.kind in 'biuf':
+        norm1 = values1.astype(np.float64)
+        norm2 = values2.astype(np.float64)
+        return (norm1 == norm2) | (np.isnan(norm1) & np.isnan(norm2))
+    codes1, codes2 = factorize_normalized(values1, values2, memo)
+    return codes1 == codes2
+
+'''-----------------------------------
+ATPCO Field Parsers
+------------------------------------'''
+# Each parser takes the distinct values of a column as upper-cased, stripped
+# text and returns a canonical comparable value per entry, or None when the
+# text does not match the format (those cells fall back to normalize_value).
+
+def _canonical(values, valid):
+    """Object array of the canonical values (tuples) where valid, None elsewhere"""
+    canonical = np.empty(len(valid), dtype=object)
+    for i in np.flatnonzero(valid):
+        canonical[i] = values[i]
+    return canonical
+
+def parse_ddmmmyy(text):
+    """ATPCO dates such as 26JUL22 -> days since epoch"""
+    dates = pd.to_datetime(text, format='%d%b%y', errors='coerce')
+    valid = dates.notna().to_numpy()
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+    return _canonical([('date', int(d)) for d in days], valid)
+
+def parse_money(text):
+    """Amounts with an optional currency such as '310.00 USD' -> (currency, 1/10000 units)"""
+    parts = text.str.extract(r'^([-+]?(?:\d+(?:\.\d*)?|\.\d+))\s*([A-Z]{3})?$')
+    amounts = pd.to_numeric(parts[0], errors='coerce')
+    valid = amounts.notna().to_numpy()
+    fixed = (amounts.fillna(0) * 10000).round().astype(np.int64).to_numpy()
+    currencies = parts[1].fillna('').to_numpy(dtype=object)
+    return _canonical([('money', cur, int(amt)) for cur, amt in zip(currencies, fixed)], valid)
+
+def parse_time_window(text):
+    """Time of day windows such as 0001-2400 -> (start, end) in HHMM"""
+    parts = text.str.extract(r'^(\d{4})\s*-\s*(\d{4})$')
+    valid = parts[0].notna().to_numpy()
+    starts = pd.to_numeric(parts[0], errors='coerce').fillna(0).astype(np.int64).to_numpy()
+    ends = pd.to_numeric(parts[1], errors='coerce').fillna(0).astype(np.int64).to_numpy()
+    return _canonical([('window', int(a), int(b)) for a, b in zip(starts, ends)], valid)
+
+def parse_day_mask(text):
+    """Day of week lists such as 1234567 -> 7-bit mask (digit order does not matter)"""
+    valid = text.str.fullmatch(r'[1-7]+').fillna(False).to_numpy(dtype=bool)
+    mask = np.zeros(len(text), dtype=np.int64)
+    for day in range(1, 8):
+        mask |= text.str.contains(str(day), regex=False).fillna(False).to_numpy(dtype=bool).astype(np.int64) << (day - 1)
+    return _canonical([('days', int(m)) for m in mask], valid)
+
+def parse_fare_class(text):
+    """Fare classes, including masked ones such as J*****, kept as text (never parsed as numbers)"""
+    valid = text.str.fullmatch(r'[A-Z0-9]+\**').fillna(False).to_numpy(dtype=bool)
+    return _canonical([('class', t) for t in text], valid)
+
+FIELD_PARSERS = {
+    'ddmmmyy': parse_ddmmmyy,
+    'money': parse_money,
+    'time_window': parse_time_window,
+    'day_mask': parse_day_mask,
+    'fare_class': parse_fare_class
+}
+
+def unique_text(uniques):
+    """Upper-cased, stripped text of distinct values; integral floats lose their '.0'"""
+    return pd.Series([str(int(val)) if isinstance(val, float) and val.is_integer() else str(val).strip().upper()
+                      for val in uniques], dtype=object)
+
+def parsed_equal_array(values1, values2, memo=None, parser=None):
+    """values_equal_array for a column with an ATPCO field parser.
+
+    Both sides are factorized together, only the distinct values are parsed
+    and cells that do not match the format fall back to normalize_value.
+    """
+    memo = {} if memo is None else memo
+    raw_codes, uniques = pd.factorize(np.concatenate([np.asarray(values1).astype(object),
+                                                      np.asarray(values2).astype(object)]))
+    canonical = parser(unique_text(uniques))
+    invalid = np.array([val is None for val in canonical], dtype=bool)
+    # Nulls (blank or whitespace-only cells included) share the -1 code
+    for i, val in zip(np.flatnonzero(invalid), normalize_uniques(uniques[invalid], memo)):
+        canonical[i] = np.nan if pd.isna(val) else ('raw', val)
+    norm_codes, _ = pd.factorize(canonical)
+    codes = np.append(norm_codes, -1)[raw_codes]
+    return codes[:len(values1)] == codes[len(values1):]
+
+def to_float_array(values):
+    """Float view of a column array; non-numeric values become NaN"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        return values.astype(np.float64)
+    stripped = pd.Series(values, dtype=object).astype(str).str.strip()
+    return pd.to_numeric(stripped, errors='coerce').to_numpy(dtype=np.float64)
+
+def within_tolerance(values1, values2, atol, rtol):
+    """Mask of pairs that are both numeric and within atol + rtol * |values2|.
+
+    atol may be a scalar or a per-row array (currency based tolerance).
+    """
+    num1 = to_float_array(values1)
+    num2 = to_float_array(values2)
+    with np.errstate(invalid='ignore'):
+        return np.isclose(num1, num2, rtol=rtol, atol=atol, equal_nan=False)
+
+def currency_tolerance(currencies):
+    """Half a minor unit of each row's currency, e.g. 0.005 USD, 0.5 JPY, 0.0005 KWD.
+
+    Absorbs float noise such as 31153 vs 31153.0000001 while a real one
+    unit difference like 100.00 vs 100.01 USD still counts as a mismatch.
+    """
+    decimals = pd.Series(currencies, dtype=object).astype(str).str.strip().str.upper().map(CURRENCY_DECIMALS)
+    return 0.5 * 10.0 ** -decimals.fillna(DEFAULT_CURRENCY_DECIMALS).to_numpy(dtype=np.float64)
+
 def normalize_filename(filename):
     return re.sub(r'\d{8}_\d{4}', '', os.path.basename(filename))
 
@@ -216,20 +484,40 @@ def list_csvs_in_zip(zip_key, download_local):
         logging.error(f"Error listing CSVs in {zip_key}: {e}")
     return csv_files
 
+def read_csv_member(zip_file, csv_filename):
+    """Read one CSV from an open ZipFile with the read options cached for its header.
+
+    With a row_filter the CSV is parsed in chunks and each chunk filtered as
+    it streams, so rejected rows are never held. The index keeps file rows.
+    """
+    with zip_file.open(csv_filename) as f:
+        header = tuple(pd.read_csv(f, nrows=0).columns)
+    with zip_file.open(csv_filename) as f:
+        if not row_filter:
+            return pd.read_csv(f, low_memory=False, **get_read_options(header))
+        chunks = [filter_rows(chunk) for chunk in pd.read_csv(f, low_memory=False, chunksize=read_chunk_rows,
+                                                             **get_read_options(header))]
+    kept = [chunk for chunk in chunks if not chunk.empty]
+    return pd.concat(kept) if len(kept) > 1 else (kept or chunks)[0]
+
+def iter_csv_member_chunks(zip_file, csv_filename, chunk_rows):
+    """Read one CSV from an open ZipFile in chunks of chunk_rows rows, each passed through the row filter."""
+    with zip_file.open(csv_filename) as f:
+        header = tuple(pd.read_csv(f, nrows=0).columns)
+    with zip_file.open(csv_filename) as f:
+        for chunk in pd.read_csv(f, low_memory=False, chunksize=chunk_rows, **get_read_options(header)):
+            yield filter_rows(chunk)
+
 def read_csv_from_zip(zip_key, csv_filename, download_local):
     """Read a specific CSV from a ZIP file into a DataFrame."""
     try:
         if download_local:
             with zipfile.ZipFile(zip_key, 'r') as z:
-                with z.open(csv_filename) as f:
-                    df = pd.read_csv(f, low_memory=False)
-                    return df
+                return read_csv_member(z, csv_filename)
         else:
             zip_obj = s3.get_object(Bucket=bucket_name, Key=zip_key)
             zip_data = zipfile.ZipFile(io.BytesIO(zip_obj['Body'].read()))
-            with zip_data.open(csv_filename) as f:
-                df = pd.read_csv(f, low_memory=False)
-                return df
+            return read_csv_member(zip_data, csv_filename)
     except Exception as e:
         thread_safe_print(f"❌ Error reading CSV {csv_filename} from {zip_key}: {e}")
         logging.error(f"Error reading CSV {csv_filename} from {zip_key}: {e}")
@@ -253,18 +541,16 @@ def read_csv_chunk(zip_csv_pairs, source_name, download_local, use_multithreadin
             if download_local:
                 with zipfile.ZipFile(zip_key, 'r') as z:
                     for csv_name in csv_filenames:
-                        with z.open(csv_name) as f:
-                            df = pd.read_csv(f, low_memory=False)
-                            with store_lock:
-                                chunk_csvs[csv_name] = df
+                        df = read_csv_member(z, csv_name)
+                        with store_lock:
+                            chunk_csvs[csv_name] = df
             else:
                 zip_obj = s3.get_object(Bucket=bucket_name, Key=zip_key)
                 zip_data = zipfile.ZipFile(io.BytesIO(zip_obj['Body'].read()))
                 for csv_name in csv_filenames:
-                    with zip_data.open(csv_name) as f:
-                        df = pd.read_csv(f, low_memory=False)
-                        with store_lock:
-                            chunk_csvs[csv_name] = df
+                    df = read_csv_member(zip_data, csv_name)
+                    with store_lock:
+                        chunk_csvs[csv_name] = df
         except Exception as e:
             thread_safe_print(f"❌ Failed to read {zip_key}: {e}")
             logging.error(f"Failed to read {zip_key}: {e}")
@@ -310,196 +596,1128 @@ def read_all_csvs_by_source(zip_keys, source_name, download_local):
     return zip_to_csvs
 
 '''-----------------------------------
-Comparison Functions
+Comparison Plans
 ------------------------------------'''
-def compare_csvs(df1, df2, file_name):
-    """Enhanced CSV comparison with detailed discrepancy tracking"""
-    summary = {
-        'Missing Columns in Neoprice': [],
-        'Missing Columns in Engine': [],
-        'Missing Rows in Neoprice': 0,
-        'Extra Rows in Neoprice': 0,
-        'Duplicate Rows in Engine': 0,
-        'Duplicate Rows in Neoprice': 0,
-        'Total Fields Compared': 0,
-        'Number of Discrepancies': 0,
-        'Number of Row Discrepancies': 0,
-        'Field Mismatches': 0,
-        'Failure %': 0.0,
-        'Pass %': 0.0,
-        'Row Failure %': 0.0,
-        'Row Pass %': 0.0,
-        'Status': 'PASS',
-        'Total Rows in Engine': 0,
-        'Total Rows in Neoprice': 0
-    }
-    diff_summary = []
-
-    # Select only specified columns if provided
-    if csv_columns:
-        df1 = df1[csv_columns]
-        df2 = df2[csv_columns]
-
-    # Track column differences
-    summary['Missing Columns in Neoprice'] = list(set(df1.columns) - set(df2.columns))
-    summary['Missing Columns in Engine'] = list(set(df2.columns) - set(df1.columns))
+_plan_cache = {}  # header signature(s) -> read options / ComparisonPlan, per process
+
+def header_signature(header):
+    """Stable hash of a CSV header row, identical across processes"""
+    return hashlib.md5('\x1f'.join(map(str, header)).encode('utf-8')).hexdigest()
+
+def get_read_options(header):
+    """pd.read_csv options for a CSV layout: projected columns and key dtypes"""
+    signature = ('read', header_signature(header))
+    if signature not in _plan_cache:
+        usecols = [col for col in header if col in set(csv_columns)] if csv_columns else None
+        _plan_cache[signature] = {
+            'usecols': usecols,
+            'dtype': {key: str for key in csv_primary_keys if key in header}
+        }
+    return _plan_cache[signature]
+
+class ComparisonPlan:
+    """Everything compare_csvs derives from the two CSV headers alone.
+
+    Built once per (Engine layout, Neoprice layout) and reused for every
+    file pair sharing those headers: the projection, column set differences,
+    the columns to compare, the comparator used for each of them and the
+    numeric tolerances configured for them.
+    """
+
+    def __init__(self, header1, header2):
+        self.signature = (header_signature(header1), header_signature(header2))
+        self.projection1 = list(csv_columns) if csv_columns else list(header1)
+        self.projection2 = list(csv_columns) if csv_columns else list(header2)
+        columns1, columns2 = set(self.projection1), set(self.projection2)
+        self.missing_in_neoprice = [col for col in self.projection1 if col not in columns2]
+        self.missing_in_engine = [col for col in self.projection2 if col not in columns1]
+        self.common_columns = [col for col in self.projection1 if col in columns2]
+        self.key_columns = list(csv_primary_keys)
+        self.compare_columns = [col for col in self.common_columns if col not in self.key_columns]
+        self.comparators = {
+            col: partial(parsed_equal_array, parser=FIELD_PARSERS[column_parsers[col.lower()]])
+            if column_parsers.get(col.lower()) in FIELD_PARSERS else values_equal_array
+            for col in self.compare_columns
+        }
+        self.tolerances = {col: column_tolerances[col.lower()] for col in self.compare_columns
+                           if col.lower() in column_tolerances}
+        # Common columns of each column profile (key columns included) and the profiles of each column
+        self.profiles = {name: [col for col in self.common_columns if col in self.key_columns or col in columns]
+                         for name, columns in column_profiles.items()}
+        self.column_profiles = {col: [name for name, columns in self.profiles.items() if col in columns]
+                                for col in self.compare_columns}
+        self.currency_column = tolerance_currency_column
+        self.uses_currency_tolerance = any(atol == 'cur' for atol, _ in self.tolerances.values())
+        # Consistency rules whose columns are all loaded, for Engine and Neoprice
+        self.consistency_rules = tuple([rule for rule in compiled_consistency_rules() if set(rule.columns) <= set(header)]
+                                       for header in (header1, header2))
+
+    def project(self, df, side):
+        """Select the plan's columns, skipping the copy when the frame already matches"""
+        projection = self.projection1 if side == 'Engine' else self.projection2
+        return df if list(df.columns) == projection else df[projection]
+
+def get_comparison_plan(header1, header2):
+    """Cached ComparisonPlan for a pair of CSV headers"""
+    signature = (header_signature(header1), header_signature(header2))
+    if signature not in _plan_cache:
+        _plan_cache[signature] = ComparisonPlan(header1, header2)
+    return _plan_cache[signature]
+
+def seed_plan_cache(plans):
+    """Pool initializer: start worker processes with the parent's plans"""
+    _plan_cache.update(plans)
 
-    common_columns = list(set(df1.columns).intersection(set(df2.columns)))
-    if not common_columns:
-        logging.info(f"No common columns to compare in {file_name}")
-        return pd.DataFrame(), summary
+'''-----------------------------------
+Consistency Rules
+------------------------------------'''
+RULE_LOGIC_PATTERN = re.compile(r'[<>!&|~]|\b(and|or|not|in)\b')  # Operators that make == part of a larger condition
+RULE_ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd)
+RULE_COMPARISONS = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+                    ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge}
+
+def split_rule_equality(expression):
+    """(left, right) of an expression whose outermost operator is a single ==, else None"""
+    depth, positions = 0, []
+    for pos, char in enumerate(expression):
+        depth += (char == '(') - (char == ')')
+        if depth == 0 and expression.startswith('==', pos):
+            positions.append(pos)
+    if len(positions) != 1:
+        return None
+    left, right = expression[:positions[0]], expression[positions[0] + 2:]
+    if RULE_LOGIC_PATTERN.search(left) or RULE_LOGIC_PATTERN.search(right):
+        return None
+    return left.strip(), right.strip()
 
-    # Reset indices and track original row numbers
-    df1 = df1.reset_index(drop=True)
-    df2 = df2.reset_index(drop=True)
-    df1['_original_row'] = df1.index + 1
-    df2['_original_row'] = df2.index + 1
+def numeric_identifiers(expression):
+    """Identifiers a compiled expression uses as numbers: in arithmetic, or compared with a number"""
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError:
+        return set()  # pd.eval reports the error
+    numeric = set()
+
+    def is_number(node):
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+        if isinstance(node, (ast.BinOp, ast.UnaryOp)):
+            return isinstance(node.op, RULE_ARITHMETIC)
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return any(is_number(element) for element in node.elts)
+        return isinstance(node, ast.Name) and node.id in numeric
+
+    # Repeat until stable, so `a` == `b` picks up a number type found for either side
+    while True:
+        found = set(numeric)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.BinOp) and isinstance(node.op, RULE_ARITHMETIC):
+                operands = [node.left, node.right]
+            elif isinstance(node, ast.UnaryOp) and isinstance(node.op, RULE_ARITHMETIC):
+                operands = [node.operand]
+            elif isinstance(node, ast.Compare) and any(is_number(operand) for operand in [node.left] + node.comparators):
+                operands = [node.left] + node.comparators
+            else:
+                continue
+            found.update(operand.id for operand in operands if isinstance(operand, ast.Name))
+        if found == numeric:
+            return numeric
+        numeric = found
+
+def rule_text(values):
+    """Column values as stripped text, missing cells NaN; whole floats lose their '.0' as in the CSV"""
+    if pd.api.types.is_float_dtype(values.dtype):
+        present = values.dropna()
+        if ((present % 1 == 0) & (present.abs() < 2**53)).all():
+            values = values.astype('Int64')
+    return values.astype(str).str.strip().where(values.notna())
+
+def rule_operand(values, numeric):
+    """Column values for a rule or filter: numbers if the expression uses the column as one, else stripped text.
+
+    Typing follows the expression, not the data, so the result does not
+    depend on which cells a chunk holds. Cells that are not numbers are NaN.
+    """
+    if not numeric:
+        return rule_text(values)
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        return values
+    return pd.to_numeric(rule_text(values), errors='coerce')
+
+def split_column_comparisons(expression, text_identifiers):
+    """(expression, {placeholder: (identifiers, operators)}) with comparisons between text columns taken out.
+
+    Each comparison whose operands are all text-typed columns, like
+    `Total Price AMT` > `Fare AMT`, is replaced by a placeholder identifier
+    so compare_text_columns can evaluate it row by row.
+    """
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError:
+        return expression, {}  # pd.eval reports the error
+    comparisons = {}
+
+    class ColumnComparisons(ast.NodeTransformer):
+        def visit_Compare(self, node):
+            operands = [node.left] + node.comparators
+            if (all(isinstance(operand, ast.Name) and operand.id in text_identifiers for operand in operands)
+                    and all(type(op) in RULE_COMPARISONS for op in node.ops)):
+                placeholder = f'_k{len(comparisons)}'
+                comparisons[placeholder] = ([operand.id for operand in operands],
+                                            [RULE_COMPARISONS[type(op)] for op in node.ops])
+                return ast.copy_location(ast.Name(id=placeholder, ctx=ast.Load()), node)
+            return self.generic_visit(node)
+
+    tree = ColumnComparisons().visit(tree)
+    return (ast.unparse(tree) if comparisons else expression), comparisons
+
+def compare_text_columns(env, identifiers, operators):
+    """A chained comparison of text columns: as numbers in rows where both sides are numbers, else as text"""
+    result = None
+    for left, right, compare in zip(identifiers, identifiers[1:], operators):
+        text1, text2 = env[left], env[right]
+        number1, number2 = pd.to_numeric(text1, errors='coerce'), pd.to_numeric(text2, errors='coerce')
+        both = (number1.notna() & number2.notna()).to_numpy()
+        holds = np.where(both, compare(number1, number2).to_numpy(dtype=bool), compare(text1, text2).to_numpy(dtype=bool))
+        result = holds if result is None else result & holds
+    return pd.Series(result, index=env[identifiers[0]].index)
+
+def rule_mask(result, length):
+    """Boolean array of length rows from a pd.eval result, missing values as False"""
+    if isinstance(result, pd.Series):
+        result = result.fillna(False)
+    return np.broadcast_to(np.asarray(result, dtype=bool), (length,))
+
+class ColumnExpression:
+    """Rule or filter text over backtick-quoted columns, prepared for pd.eval.
+
+    Each column is renamed to a plain identifier once; compile() rewrites
+    any part of the text with those identifiers, and operands() builds the
+    matching pd.eval local_dict from a frame. A column is compared as
+    stripped text unless a compiled part uses it in arithmetic or against a
+    number, e.g. `Fare Class` == "Y" is text and `O/R` == 2 numeric. Two
+    text columns compared with each other are compared as numbers in the
+    rows where both hold numbers, so 10889 > 5668 and 5668 == 5668.0.
+    """
+
+    def __init__(self, text, setting):
+        self.text = ' '.join(text.split())
+        self.columns = list(dict.fromkeys(RULE_COLUMN_PATTERN.findall(self.text)))
+        if not self.columns:
+            raise ValueError(f"{setting} names no `column`")
+        self.variables = {col: f'_c{i}' for i, col in enumerate(self.columns)}
+        self.numeric = set()
+        self.evaluated = {}  # compiled text -> (pd.eval expression, column comparisons)
+
+    def compile(self, expression):
+        """Expression text with each `column` replaced by its identifier"""
+        compiled = RULE_COLUMN_PATTERN.sub(lambda match: self.variables[match.group(1)], expression.strip())
+        self.numeric |= numeric_identifiers(compiled)
+        return compiled
+
+    def operands(self, df):
+        """pd.eval local_dict with the values of every column in df"""
+        return {var: rule_operand(df[col], var in self.numeric) for col, var in self.variables.items()}
+
+    def evaluate(self, compiled, env):
+        """pd.eval result of a compiled part, with comparisons between text columns done by compare_text_columns"""
+        if compiled not in self.evaluated:
+            text_identifiers = set(self.variables.values()) - self.numeric
+            self.evaluated[compiled] = split_column_comparisons(compiled, text_identifiers)
+        expression, comparisons = self.evaluated[compiled]
+        if comparisons:
+            env = dict(env, **{placeholder: compare_text_columns(env, identifiers, operators)
+                               for placeholder, (identifiers, operators) in comparisons.items()})
+        return pd.eval(expression, local_dict=env)
+
+    def mask(self, compiled, env, length):
+        """Rows where a compiled expression holds; rows with an empty cell in any of its columns never do"""
+        present = [env[var].notna().to_numpy() for var in self.variables.values()
+                   if re.search(rf'\b{var}\b', compiled)]
+        return np.logical_and.reduce([rule_mask(self.evaluate(compiled, env), length)] + present)
+
+class ConsistencyRule:
+    """One [consistency_rules] check on the values of a single row.
+
+    The rule is an expression over backtick-quoted columns, optionally
+    followed by 'when <condition>'. If its outermost operator is ==, the
+    two sides must agree within consistency_tolerance; any other rule must
+    evaluate to True. Rows failing the condition, or with an empty checked
+    column, are not evaluated. Columns are renamed to plain identifiers
+    once, and every evaluation runs vectorized through pd.eval.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.expression = ColumnExpression(text, f"[consistency_rules] {name}")
+        self.text, self.columns = self.expression.text, self.expression.columns
+        check, _, condition = self.text.partition(' when ')
+        self.checked = list(dict.fromkeys(RULE_COLUMN_PATTERN.findall(check)))
+        self.check = self.expression.compile(check)
+        self.condition = self.expression.compile(condition) if condition else None
+        self.operands = split_rule_equality(self.check)
+
+    def violations(self, df):
+        """(positions, detail text) of the rows of df that break the rule"""
+        env = self.expression.operands(df)
+        applicable = np.logical_and.reduce([env[self.expression.variables[col]].notna().to_numpy()
+                                            for col in self.checked])
+        if self.condition:
+            applicable &= self.expression.mask(self.condition, env, len(df))
+        if self.operands:
+            left, right = (np.broadcast_to(np.asarray(self.expression.evaluate(operand, env)), (len(df),))
+                           for operand in self.operands)
+            # As numbers within consistency_tolerance where both sides are numbers, else as text
+            number1, number2 = (pd.to_numeric(pd.Series(side), errors='coerce').to_numpy(dtype=float)
+                                for side in (left, right))
+            both = ~np.isnan(number1) & ~np.isnan(number2)
+            holds = np.where(both, np.isclose(number1, number2, rtol=0, atol=consistency_tolerance), left == right)
+            positions = np.flatnonzero(applicable & ~holds)
+            details = pd.Series(left[positions]).astype(str) + ' != ' + pd.Series(right[positions]).astype(str)
+        else:
+            positions = np.flatnonzero(applicable & ~rule_mask(self.expression.evaluate(self.check, env), len(df)))
+            details = pd.Series([
+                '; '.join(f'{col}={value}' for col, value in zip(self.checked, values))
+                for values in zip(*(df[col].to_numpy()[positions] for col in self.checked))
+            ], dtype=object)
+        return positions, details.to_numpy(dtype=object)
+
+def compiled_consistency_rules():
+    """The configured consistency rules, compiled once"""
+    if 'consistency_rules' not in _plan_cache:
+        _plan_cache['consistency_rules'] = [ConsistencyRule(name, text) for name, text in consistency_rules.items()]
+    return _plan_cache['consistency_rules']
+
+def consistency_violations(df, rules):
+    """(rule, positions, details) for every rule of one side that some row breaks"""
+    found = []
+    for rule in rules:
+        positions, details = rule.violations(df)
+        if len(positions):
+            found.append((rule, positions, details))
+    return found
+
+def consistency_records(df, violations, side, budget):
+    """Rule violation records of one side, status 'Rule Violation in <side>'.
+
+    Yields budgeted record batches and returns {rule name: violating rows}.
+    """
+    row_numbers = df['_original_row'].to_numpy()
+    is_engine = side == 'Engine'
+    for rule, positions, details in violations:
+        if summary_only:
+            continue
+        def build(selected, rule=rule, positions=positions, details=details):
+            rows = positions[selected]
+            return pd.DataFrame({
+                'PrimaryKey': (rebuild_primary_keys(df, rows) if csv_primary_keys
+                               else positional_keys(row_numbers[rows], side)),
+                'Column': rule.name,
+                'Engine_Value': details[selected] if is_engine else '',
+                'Neoprice_Value': '' if is_engine else details[selected],
+                'RowNum_Engine': row_numbers[rows] if is_engine else '',
+                'RowNum_Neoprice': '' if is_engine else row_numbers[rows],
+                'Status': f'Rule Violation in {side}'
+            }, columns=DIFF_COLUMNS)
+        yield budget.take(len(positions), build)
+    return {rule.name: len(positions) for rule, positions, _ in violations}
 
-    # Clean primary keys
-    for key in csv_primary_keys:
-        df1[key] = df1[key].astype(str).str.strip()
-        df2[key] = df2[key].astype(str).str.strip()
+'''-----------------------------------
+Row Filter
+------------------------------------'''
+class RowFilter:
+    """The [keys] row_filter condition, e.g. `Sellable Status` == "ACTIVE".
+
+    Written like a consistency rule condition over backtick-quoted columns
+    and evaluated per parsed chunk through pd.eval, so rejected rows are
+    dropped before key cleaning and never reach memory or the comparison.
+    Rows with an empty cell in any filter column are rejected, whatever the
+    operator, so `PTC` != "ADT" does not keep rows without a PTC.
+    """
+
+    def __init__(self, text):
+        self.expression = ColumnExpression(text, "[keys] row_filter")
+        self.text, self.columns = self.expression.text, self.expression.columns
+        self.condition = self.expression.compile(self.text)
+
+    def mask(self, df):
+        """Boolean array marking the rows of df that meet the condition"""
+        missing = [col for col in self.columns if col not in df.columns]
+        if missing:
+            raise KeyError(f"[keys] row_filter columns not in CSV: {missing}")
+        return self.expression.mask(self.condition, self.expression.operands(df), len(df))
+
+def compiled_row_filter():
+    """The configured row filter, compiled once"""
+    if 'row_filter' not in _plan_cache:
+        _plan_cache['row_filter'] = RowFilter(row_filter)
+    return _plan_cache['row_filter']
+
+def filter_rows(chunk):
+    """Rows of a parsed chunk kept by the row filter; the index keeps file row positions"""
+    if not row_filter or chunk.empty:
+        return chunk
+    return chunk[compiled_row_filter().mask(chunk)]
+
+def consistency_counts(plan, tallies1, tallies2):
+    """Summary counts of the rule violations on both sides, empty when no rule applies"""
+    if not (plan.consistency_rules[0] or plan.consistency_rules[1]):
+        return {}
+    by_rule = {}
+    for tallies in (tallies1, tallies2):
+        for name, count in tallies.items():
+            by_rule[name] = by_rule.get(name, 0) + count
+    return {
+        'Rule Violations in Engine': sum(tallies1.values()),
+        'Rule Violations in Neoprice': sum(tallies2.values()),
+        'Rule Violations': by_rule
+    }
 
-    # Convert relevant columns to categorical where appropriate
-    for col in csv_primary_keys:
-        if len(df1) > 0 and df1[col].nunique() / len(df1) < 0.5:
-            df1[col] = df1[col].astype('category')
-            df2[col] = df2[col].astype('category')
+'''-----------------------------------
+Comparison Functions
+------------------------------------'''
+DIFF_COLUMNS = ['PrimaryKey', 'Column', 'Engine_Value', 'Neoprice_Value',
+                'RowNum_Engine', 'RowNum_Neoprice', 'Status']
+ROW_HASH_PRIME = np.uint64(0x100000001B3)  # FNV-1a 64-bit prime for combining column hashes
+
+class DiffBudget:
+    """Per-file cap on the number of detailed diff records.
+
+    Records are offered in the order they are produced. The first
+    max_diff_records of them (at most max_diff_records_per_column mismatches
+    per column) are kept in full; past that only the counts keep growing and
+    a uniform sample of diff_sample_size excess records is kept. Sampling
+    gives every excess record a random key and keeps the smallest keys
+    (bottom-k), which is reservoir sampling done a batch at a time. A file
+    compared in `share` key partitions gives each partition its share.
+    """
+
+    def __init__(self, file_name, share=1):
+        self.limit = -(-max_diff_records // share)
+        self.column_limit = -(-max_diff_records_per_column // share)
+        self.sample_size = -(-diff_sample_size // share)
+        self.kept = 0
+        self.column_kept = {}
+        self.excess = 0
+        self.sample = pd.DataFrame(columns=DIFF_COLUMNS)
+        self.sample_keys = np.empty(0)
+        # Seeded from the file name so reruns sample the same records
+        self.rng = np.random.default_rng(int(header_signature([file_name])[:16], 16))
+
+    def split(self, count, column=None):
+        """Split `count` new records into positions kept in full and sample candidates.
+
+        Returns (keep, sample, keys): positions within the batch kept in
+        full, positions that may enter the sample and their random keys.
+        """
+        room = count = int(count)
+        if self.limit:
+            room = min(room, max(self.limit - self.kept, 0))
+        if column is not None and self.column_limit:
+            room = min(room, max(self.column_limit - self.column_kept.get(column, 0), 0))
+        self.kept += room
+        if column is not None:
+            self.column_kept[column] = self.column_kept.get(column, 0) + room
+        rest = count - room
+        self.excess += rest
+        if not rest or not self.sample_size:
+            return np.arange(room), np.empty(0, dtype=int), np.empty(0)
+
+        keys = self.rng.random(rest)
+        threshold = (np.partition(self.sample_keys, self.sample_size - 1)[self.sample_size - 1]
+                     if len(self.sample_keys) >= self.sample_size else 1.0)
+        candidates = np.flatnonzero(keys < threshold)
+        if len(candidates) > self.sample_size:
+            candidates = np.sort(candidates[np.argpartition(keys[candidates], self.sample_size - 1)[:self.sample_size]])
+        return np.arange(room), room + candidates, keys[candidates]
+
+    def offer(self, records, keys):
+        """Merge sample candidates into the sample, keeping the smallest keys"""
+        if records.empty:
+            return
+        sample = pd.concat([self.sample, records], ignore_index=True) if not self.sample.empty else records
+        keys = np.concatenate([self.sample_keys, keys])
+        if len(keys) > self.sample_size:
+            keep = np.sort(np.argpartition(keys, self.sample_size - 1)[:self.sample_size])
+            sample, keys = sample.iloc[keep].reset_index(drop=True), keys[keep]
+        self.sample, self.sample_keys = sample, keys
+
+    def close(self, summary, file_name):
+        """Record the sampling in the summary and yield the sampled records"""
+        summary['Sampled Diff Records'] = {'Kept': self.kept, 'Past Budget': self.excess, 'Sampled': len(self.sample)}
+        logging.info(f"{file_name}: {self.excess} diff records past the budget, {len(self.sample)} sampled")
+        if not self.sample.empty:
+            yield self.sample
+
+    def take(self, count, build, column=None):
+        """Budgeted records from a builder taking positions 0..count-1; samples the rest"""
+        keep, sample, keys = self.split(count, column)
+        if len(sample):
+            self.offer(build(sample), keys)
+        return build(keep)
+
+def row_content_hashes(df1, df2, pos1, pos2, compare_columns):
+    """64-bit content hash of the compared columns for each aligned row pair.
+
+    Columns that are numeric on both sides are hashed as float64 so int/float
+    dtype drift does not change the hash. Equal hashes are taken as equal
+    rows; any other difference in raw representation only makes the rows
+    fall through to the cell-level comparison.
+    """
+    hashes1 = np.zeros(len(pos1), dtype=np.uint64)
+    hashes2 = np.zeros(len(pos2), dtype=np.uint64)
+    for col in compare_columns:
+        values1 = df1[col].to_numpy()
+        values2 = df2[col].to_numpy()
+        if values1.dtype.kind in 'biuf' and values2.dtype.kind in 'biuf':
+            values1 = values1.astype(np.float64)
+            values2 = values2.astype(np.float64)
+        hashes1 = (hashes1 ^ pd.util.hash_array(values1)[pos1]) * ROW_HASH_PRIME
+        hashes2 = (hashes2 ^ pd.util.hash_array(values2)[pos2]) * ROW_HASH_PRIME
+    return hashes1, hashes2
+
+def compare_common_rows(df1, df2, pos1, pos2, plan, file_name, key_values, budget):
+    """Compare aligned common rows column by column with array masks.
+
+    pos1/pos2 are the paired row positions of the common rows and key_values
+    maps positions within them to PrimaryKey values. Columns, comparators
+    and tolerances come from the ComparisonPlan. Generator: yields the
+    mismatch records of each block of stream_batch_rows candidate rows in
+    row-major order and returns a boolean array flagging which common rows
+    have at least one mismatching field, the number of mismatches per
+    column and the same row flags per column profile. In summary_only mode
+    nothing is yielded; otherwise records past the DiffBudget go to its
+    sample. With column_threads > 1 the column masks of each block are
+    computed on one thread pool kept for the whole comparison (numeric
+    kernels release the GIL) and merged in column order, so the output does
+    not depend on the mode.
+    """
+    compare_columns = plan.compare_columns
+    row_numbers1 = df1['_original_row'].to_numpy()[pos1]
+    row_numbers2 = df2['_original_row'].to_numpy()[pos2]
+    row_has_mismatch = np.zeros(len(pos1), dtype=bool)
+    profile_rows = {name: np.zeros(len(pos1), dtype=bool) for name in plan.profiles}
+    column_tallies = {}
+    column_workers = min(column_threads, os.cpu_count() or 1)
+    # Normalized value per distinct raw value: one memo shared by all columns, or one per column
+    # on the thread pool so no two threads write the same dict
+    norm_memos = ({col: {} for col in compare_columns} if column_workers > 1
+                  else dict.fromkeys(compare_columns, {}))
+
+    def mismatch_records(rows, cols, engine_values, neoprice_values):
+        return pd.DataFrame({
+            'PrimaryKey': key_values(rows),
+            'Column': np.asarray(compare_columns, dtype=object)[cols],
+            'Engine_Value': engine_values.astype(object),
+            'Neoprice_Value': neoprice_values.astype(object),
+            'RowNum_Engine': row_numbers1[rows].astype(int),
+            'RowNum_Neoprice': row_numbers2[rows].astype(int),
+            'Status': 'Mismatch'
+        })
 
-    # Remove rows with null primary keys
-    df1 = df1.dropna(subset=csv_primary_keys)
-    df2 = df2.dropna(subset=csv_primary_keys)
+    # Fast path: only rows whose content hashes differ need a cell-level check
+    all_candidates = np.arange(len(pos1))
+    if row_hash_fast_path and len(pos1):
+        hashes1, hashes2 = row_content_hashes(df1, df2, pos1, pos2, compare_columns)
+        all_candidates = np.flatnonzero(hashes1 != hashes2)
 
-    # Add total cleaned row counts to summary
-    summary['Total Rows in Engine'] = len(df1)
-    summary['Total Rows in Neoprice'] = len(df2)
+    progress = tqdm(total=len(all_candidates), desc=f"Comparing rows ({file_name})",
+                    unit="rows", dynamic_ncols=True, leave=False)
+    executor = ThreadPoolExecutor(max_workers=column_workers) if column_workers > 1 else None
+    try:
+        for block_start in range(0, len(all_candidates), stream_batch_rows):
+            candidates = all_candidates[block_start:block_start + stream_batch_rows]
+            cand1, cand2 = pos1[candidates], pos2[candidates]
+
+            # Per-row absolute tolerance for columns configured with 'cur'
+            currency_atol = None
+            if plan.uses_currency_tolerance:
+                currency_atol = currency_tolerance(df1[plan.currency_column].to_numpy()[cand1]
+                                                   if plan.currency_column in df1.columns else np.full(len(cand1), None))
+
+            def column_mismatch(col, cand1=cand1, cand2=cand2, currency_atol=currency_atol):
+                values1 = df1[col].to_numpy()[cand1]
+                values2 = df2[col].to_numpy()[cand2]
+                mismatch = ~plan.comparators[col](values1, values2, norm_memos[col])
+                if col in plan.tolerances and mismatch.any():
+                    atol, rtol = plan.tolerances[col]
+                    atol = currency_atol if atol == 'cur' else atol
+                    mismatch &= ~within_tolerance(values1, values2, atol, rtol)
+                return values1, values2, mismatch
+
+            if executor is not None:
+                column_results = list(executor.map(column_mismatch, compare_columns))
+            else:
+                column_results = map(column_mismatch, compare_columns)
+
+            hit_rows, hit_cols, engine_values, neoprice_values = [], [], [], []
+            for col_pos, (col, (values1, values2, mismatch)) in enumerate(zip(compare_columns, column_results)):
+                hits = np.nonzero(mismatch)[0]
+                if len(hits):
+                    rows = candidates[hits]
+                    row_has_mismatch[rows] = True
+                    for name in plan.column_profiles[col]:
+                        profile_rows[name][rows] = True
+                    column_tallies[col] = column_tallies.get(col, 0) + len(hits)
+                    if summary_only:
+                        continue
+                    keep, sample, keys = budget.split(len(hits), col)
+                    if len(sample):
+                        budget.offer(mismatch_records(candidates[hits[sample]], np.full(len(sample), col_pos),
+                                                      values1[hits[sample]], values2[hits[sample]]), keys)
+                    hits = hits[keep]
+                    if not len(hits):
+                        continue
+                    hit_rows.append(candidates[hits])
+                    hit_cols.append(np.full(len(hits), col_pos))
+                    engine_values.append(values1[hits].astype(object))
+                    neoprice_values.append(values2[hits].astype(object))
+            progress.update(len(candidates))
+
+            if hit_rows:
+                # Restore row-major order (row by row, columns in compare order)
+                rows = np.concatenate(hit_rows)
+                cols = np.concatenate(hit_cols)
+                order = np.lexsort((cols, rows))
+                yield mismatch_records(rows[order], cols[order], np.concatenate(engine_values)[order],
+                                       np.concatenate(neoprice_values)[order])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        progress.close()
+    return row_has_mismatch, column_tallies, profile_rows
+
+def duplicate_records(primary_keys, row_numbers, group_codes, side, groups=None):
+    """DUPLICATE_ROW records for one side, built with a single groupby.
+
+    group_codes numbers the duplicate rows by key in order of first
+    appearance and primary_keys holds the PrimaryKey of each group.
+    groups optionally restricts the records to those group numbers.
+    """
+    if groups is not None:
+        lookup = np.full(len(primary_keys), -1)
+        lookup[groups] = np.arange(len(groups))
+        group_codes = lookup[group_codes]
+        selected = group_codes >= 0
+        primary_keys, row_numbers, group_codes = primary_keys[groups], row_numbers[selected], group_codes[selected]
+    grouped = pd.Series(row_numbers.astype(str)).groupby(group_codes, sort=True)
+    occurrences = 'Duplicate (' + grouped.size().astype(str).to_numpy() + ' occurrences)'
+    row_lists = grouped.agg(', '.join).to_numpy()
+    is_engine = side == 'Engine'
+    return pd.DataFrame({
+        'PrimaryKey': primary_keys,
+        'Column': 'DUPLICATE_ROW',
+        'Engine_Value': occurrences if is_engine else '',
+        'Neoprice_Value': '' if is_engine else occurrences,
+        'RowNum_Engine': row_lists if is_engine else '',
+        'RowNum_Neoprice': '' if is_engine else row_lists,
+        'Status': f'Duplicate in {side}'
+    }, columns=DIFF_COLUMNS)
+
+def unmatched_records(primary_keys, row_numbers, side):
+    """MISSING_ROW (side='Engine') or EXTRA_ROW (side='Neoprice') records as one frame"""
+    is_engine = side == 'Engine'
+    return pd.DataFrame({
+        'PrimaryKey': primary_keys,
+        'Column': 'MISSING_ROW' if is_engine else 'EXTRA_ROW',
+        'Engine_Value': 'Exists' if is_engine else 'Missing',
+        'Neoprice_Value': 'Missing' if is_engine else 'Exists',
+        'RowNum_Engine': row_numbers if is_engine else '',
+        'RowNum_Neoprice': '' if is_engine else row_numbers,
+        'Status': 'Missing in Neoprice' if is_engine else 'Extra in Neoprice'
+    }, columns=DIFF_COLUMNS)
+
+def frame_column(df, col):
+    """Values of a column, also when it is an index level as in the indexed path"""
+    if col in df.columns:
+        return df[col].to_numpy()
+    return df.index.get_level_values(col).to_numpy()
+
+def pair_rekeyed_rows(df1, df2, missing_pos, extra_pos, plan):
+    """Pair missing Engine rows with extra Neoprice rows whose key changed.
+
+    Candidates must agree on the blocking columns (stable key parts), and
+    blocks with more than rekey_max_block_pairs candidate pairs are skipped,
+    which keeps the cost near-linear. Each candidate is scored by the share
+    of the other common columns that are equal. Pairs are taken greedily
+    from the best score down to rekey_min_similarity. Returns the paired
+    positions (rekeyed1, rekeyed2), empty when the pass is disabled.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    blocking = [col for col in rekey_blocking_columns if col in plan.common_columns]
+    scoring = [col for col in plan.common_columns if col not in blocking]
+    if not rekey_enabled or not len(missing_pos) or not len(extra_pos) or not scoring:
+        return empty, empty
+
+    # Block number of every missing and extra row, shared by both sides
+    block_codes = np.zeros(len(missing_pos) + len(extra_pos), dtype=np.int64)
+    for col in blocking:
+        codes, cleaned = clean_key_values(pd.Series(np.concatenate([
+            frame_column(df1, col)[missing_pos].astype(object), frame_column(df2, col)[extra_pos].astype(object)
+        ])))
+        clean_codes, uniques = pd.factorize(cleaned)
+        block_codes, _ = pd.factorize(block_codes * len(uniques) + clean_codes[codes])
+    blocks1, blocks2 = block_codes[:len(missing_pos)], block_codes[len(missing_pos):]
+
+    # Candidates: every missing row against every extra row of its block
+    num_blocks = block_codes.max() + 1
+    count1 = np.bincount(blocks1, minlength=num_blocks)
+    count2 = np.bincount(blocks2, minlength=num_blocks)
+    usable = (count1 * count2 > 0) & (count1 * count2 <= rekey_max_block_pairs)
+    if ((count1 * count2) > rekey_max_block_pairs).any():
+        logging.info(f"Re-key pass skipped {int(((count1 * count2) > rekey_max_block_pairs).sum())} oversized blocks")
+    order2 = np.argsort(blocks2, kind='stable')
+    starts2 = np.cumsum(count2) - count2
+    rows1 = np.flatnonzero(usable[blocks1])
+    cand1 = np.repeat(rows1, count2[blocks1[rows1]])
+    cand2 = order2[expand_ranges(starts2[blocks1[rows1]], count2[blocks1[rows1]])]
+    if not len(cand1):
+        return empty, empty
+
+    scores = np.zeros(len(cand1))
+    memo = {}
+    for col in scoring:
+        scores += values_equal_array(frame_column(df1, col)[missing_pos[cand1]],
+                                     frame_column(df2, col)[extra_pos[cand2]], memo)
+    scores /= len(scoring)
+
+    # Greedy one-to-one assignment, best scores first
+    ranked = np.flatnonzero(scores >= rekey_min_similarity)
+    ranked = ranked[np.argsort(-scores[ranked], kind='stable')]
+    used1 = np.zeros(len(missing_pos), dtype=bool)
+    used2 = np.zeros(len(extra_pos), dtype=bool)
+    pairs = []
+    for candidate in ranked:
+        i, j = cand1[candidate], cand2[candidate]
+        if not used1[i] and not used2[j]:
+            used1[i] = used2[j] = True
+            pairs.append((i, j))
+    if not pairs:
+        return empty, empty
+    paired1, paired2 = np.array(pairs).T
+    order = np.argsort(missing_pos[paired1])
+    return missing_pos[paired1][order], extra_pos[paired2][order]
+
+def rekeyed_records(df1, df2, rekeyed1, rekeyed2, plan, file_name, key_values1, key_values2, budget):
+    """Diff records for re-keyed row pairs, status 'Re-keyed'.
+
+    Generator: yields one REKEYED_ROW record per pair with the Engine and
+    Neoprice keys as values, then the field differences of the pairs, and
+    returns the field differences per column. key_values1/key_values2 map
+    row positions to PrimaryKey values on each side.
+    """
+    if not len(rekeyed1):
+        return {}
+    row_numbers1 = df1['_original_row'].to_numpy()
+    row_numbers2 = df2['_original_row'].to_numpy()
+    if not summary_only:
+        def build(positions):
+            return pd.DataFrame({
+                'PrimaryKey': key_values1(rekeyed1[positions]),
+                'Column': 'REKEYED_ROW',
+                'Engine_Value': key_values1(rekeyed1[positions]),
+                'Neoprice_Value': key_values2(rekeyed2[positions]),
+                'RowNum_Engine': row_numbers1[rekeyed1[positions]],
+                'RowNum_Neoprice': row_numbers2[rekeyed2[positions]],
+                'Status': 'Re-keyed'
+            }, columns=DIFF_COLUMNS)
+        yield budget.take(len(rekeyed1), build)
+
+    batches = compare_common_rows(df1, df2, rekeyed1, rekeyed2, plan, file_name,
+                                  lambda rows: key_values1(rekeyed1[rows]), budget)
+    while True:
+        try:
+            batch = next(batches)
+        except StopIteration as stop:
+            _, column_tallies, _ = stop.value
+            return column_tallies
+        batch['Status'] = 'Re-keyed'
+        yield batch
+
+def rekeyed_counts(rekeyed1, rekeyed_tallies):
+    """Summary counts of the re-key pass (nothing when it paired no rows)"""
+    if not len(rekeyed1):
+        return {}
+    return {'Re-keyed Rows': len(rekeyed1), 'Re-keyed Field Differences': sum(rekeyed_tallies.values())}
+
+def profile_counts(plan, common_rows, column_tallies, profile_rows, row_discrepancies):
+    """Summary counts of each column profile (nothing when none are configured).
+
+    row_discrepancies maps a mismatch mask over the common rows to the number
+    of discrepant rows; missing, extra, re-keyed and duplicate rows count
+    for every profile.
+    """
+    if not plan.profiles:
+        return {}
+    return {'Column Profiles': {
+        name: {
+            'Total Fields Compared': common_rows * len(columns),
+            'Field Mismatches': sum(column_tallies.get(col, 0) for col in columns),
+            'Number of Row Discrepancies': row_discrepancies(profile_rows[name]),
+            'Column Mismatches': {col: count for col, count in column_tallies.items() if col in columns}
+        }
+        for name, columns in plan.profiles.items()
+    }}
+
+def compare_indexed(df1, df2, plan, file_name, budget):
+    """Align rows on a sorted primary key (Multi)Index and compare them.
+
+    Generator: yields the diff record frames (duplicates, missing, extra,
+    then mismatches; none in summary_only mode) as they are built and
+    returns the counts for the summary and the de-duplicated row counts of
+    both sides.
+    """
 
     # Set primary keys as index and sort
     df1 = df1.set_index(csv_primary_keys).sort_index()
     df2 = df2.set_index(csv_primary_keys).sort_index()
 
     # Track duplicates
-    summary['Duplicate Rows in Engine'] = df1.index.duplicated().sum()
-    summary['Duplicate Rows in Neoprice'] = df2.index.duplicated().sum()
-
     dup_rows_engine = df1[df1.index.duplicated(keep=False)]
     dup_rows_neoprice = df2[df2.index.duplicated(keep=False)]
 
-    for pk in dup_rows_engine.index.unique():
-        row_numbers = dup_rows_engine.loc[pk]['_original_row'].tolist()
-        diff_summary.append({
-            'PrimaryKey': pk,
-            'Column': 'DUPLICATE_ROW',
-            'Engine_Value': f"Duplicate ({len(row_numbers)} occurrences)",
-            'Neoprice_Value': '',
-            'RowNum_Engine': ', '.join(map(str, row_numbers)),
-            'RowNum_Neoprice': '',
-            'Status': 'Duplicate in Engine'
-        })
-
-    for pk in dup_rows_neoprice.index.unique():
-        row_numbers = dup_rows_neoprice.loc[pk]['_original_row'].tolist()
-        diff_summary.append({
-            'PrimaryKey': pk,
-            'Column': 'DUPLICATE_ROW',
-            'Engine_Value': '',
-            'Neoprice_Value': f"Duplicate ({len(row_numbers)} occurrences)",
-            'RowNum_Engine': '',
-            'RowNum_Neoprice': ', '.join(map(str, row_numbers)),
-            'Status': 'Duplicate in Neoprice'
-        })
+    # Sorted index keeps each duplicated key contiguous, so groups start at first occurrences
+    for dup_rows, side in ((dup_rows_engine, 'Engine'), (dup_rows_neoprice, 'Neoprice')):
+        if summary_only:
+            break
+        first_mask = ~dup_rows.index.duplicated()
+        yield budget.take(first_mask.sum(), partial(
+            duplicate_records, dup_rows.index[first_mask].to_flat_index().to_numpy(),
+            dup_rows['_original_row'].to_numpy(), np.cumsum(first_mask) - 1, side
+        ))
+
+    counts = {
+        'Duplicate Rows in Engine': df1.index.duplicated().sum(),
+        'Duplicate Rows in Neoprice': df2.index.duplicated().sum()
+    }
 
     # Remove duplicates for further comparison
     df1 = df1[~df1.index.duplicated()]
     df2 = df2[~df2.index.duplicated()]
 
-    # Track missing and extra rows
-    missing_in_neoprice = df1.index.difference(df2.index)
-    extra_in_neoprice = df2.index.difference(df1.index)
-
-    summary['Missing Rows in Neoprice'] = len(missing_in_neoprice)
-    summary['Extra Rows in Neoprice'] = len(extra_in_neoprice)
-
-    for pk in missing_in_neoprice:
-        diff_summary.append({
-            'PrimaryKey': pk,
-            'Column': 'MISSING_ROW',
-            'Engine_Value': 'Exists',
-            'Neoprice_Value': 'Missing',
-            'RowNum_Engine': df1.loc[pk, '_original_row'],
-            'RowNum_Neoprice': '',
-            'Status': 'Missing in Neoprice'
-        })
+    # Track missing and extra rows with one lookup of Engine keys in Neoprice
+    match = df2.index.get_indexer(df1.index)
+    missing_mask = match < 0
+    extra_mask = np.ones(len(df2), dtype=bool)
+    extra_mask[match[~missing_mask]] = False
+    pos1 = np.flatnonzero(~missing_mask)
+    rekeyed1, rekeyed2 = pair_rekeyed_rows(df1, df2, np.flatnonzero(missing_mask), np.flatnonzero(extra_mask), plan)
+    missing_mask[rekeyed1] = False
+    extra_mask[rekeyed2] = False
+    missing_in_neoprice = df1.index[missing_mask]
+    extra_in_neoprice = df2.index[extra_mask]
+
+    if not summary_only:
+        for keys, row_numbers, side in (
+            (missing_in_neoprice.to_flat_index().to_numpy(), df1['_original_row'].to_numpy()[missing_mask], 'Engine'),
+            (extra_in_neoprice.to_flat_index().to_numpy(), df2['_original_row'].to_numpy()[extra_mask], 'Neoprice')
+        ):
+            def build(positions, keys=keys, row_numbers=row_numbers, side=side):
+                return unmatched_records(keys[positions], row_numbers[positions], side)
+            yield budget.take(len(keys), build)
+    rekeyed_tallies = yield from rekeyed_records(
+        df1, df2, rekeyed1, rekeyed2, plan, file_name,
+        lambda positions: df1.index[positions].to_flat_index().to_numpy(),
+        lambda positions: df2.index[positions].to_flat_index().to_numpy(), budget
+    )
 
-    for pk in extra_in_neoprice:
-        diff_summary.append({
-            'PrimaryKey': pk,
-            'Column': 'EXTRA_ROW',
-            'Engine_Value': 'Missing',
-            'Neoprice_Value': 'Exists',
-            'RowNum_Engine': '',
-            'RowNum_Neoprice': df2.loc[pk, '_original_row'],
-            'Status': 'Extra in Neoprice'
-        })
+    # Compare common rows column-wise on the aligned frames; key columns live
+    # in the index so they count as compared fields but can never mismatch
+    pos2 = match[pos1]
+    common_idx = df1.index[pos1]
+    row_has_mismatch, column_tallies, profile_rows = yield from compare_common_rows(
+        df1, df2, pos1, pos2, plan, file_name,
+        lambda rows: common_idx[rows].to_flat_index().to_numpy(), budget
+    )
+
+    # Add rows with missing, extra, or duplicate issues to discrepant_rows
+    def row_discrepancies(mismatch):
+        return len(common_idx[mismatch].append([
+            missing_in_neoprice,
+            extra_in_neoprice,
+            df1.index[rekeyed1],
+            dup_rows_engine.index,
+            dup_rows_neoprice.index
+        ]).unique())
+
+    counts.update({
+        'Missing Rows in Neoprice': len(missing_in_neoprice),
+        'Extra Rows in Neoprice': len(extra_in_neoprice),
+        'Total Fields Compared': len(common_idx) * len(plan.common_columns),
+        'Field Mismatches': sum(column_tallies.values()),
+        'Number of Row Discrepancies': row_discrepancies(row_has_mismatch),
+        'Column Mismatches': column_tallies
+    })
+    counts.update(rekeyed_counts(rekeyed1, rekeyed_tallies))
+    counts.update(profile_counts(plan, len(common_idx), column_tallies, profile_rows, row_discrepancies))
+    return counts, (len(df1), len(df2))
+
+def rebuild_primary_keys(df, positions):
+    """Rebuild PrimaryKey values (tuple, or scalar for a single key) for the given row positions"""
+    key_columns = [df[key].to_numpy()[positions] for key in csv_primary_keys]
+    if len(key_columns) == 1:
+        return key_columns[0].astype(object)
+    keys = np.empty(len(positions), dtype=object)
+    keys[:] = list(zip(*key_columns))
+    return keys
+
+def encode_primary_keys(df1, df2):
+    """Clean and dictionary-encode each key column against one dictionary shared by both sides.
+
+    Cleaning (str + strip, nulls become 'nan' as with astype(str)) runs on
+    the distinct raw values only. Key columns become categoricals with
+    identical (sorted) categories on Engine and Neoprice, so both frames
+    store small integer codes that can be compared directly and index
+    operations never reconcile categories.
+    """
+    for key in csv_primary_keys:
+        raw_codes, raw_uniques = pd.factorize(np.concatenate([df1[key].to_numpy(dtype=object),
+                                                              df2[key].to_numpy(dtype=object)]))
+        cleaned = np.array([str(val).strip() for val in raw_uniques] + ['nan'], dtype=object)
+        clean_codes, uniques = pd.factorize(cleaned, sort=True)
+        codes = clean_codes[raw_codes]
+        categories = pd.Index(uniques)
+        df1[key] = pd.Categorical.from_codes(codes[:len(df1)], categories=categories)
+        df2[key] = pd.Categorical.from_codes(codes[len(df1):], categories=categories)
+
+def key_codes(df):
+    """Shared dictionary codes of the encoded key columns as an integer frame"""
+    return pd.DataFrame({key: df[key].cat.codes for key in csv_primary_keys})
+
+def hash_primary_keys(df1, df2):
+    """Hash the encoded primary key columns of each row into one uint64.
+
+    Returns (hashes1, hashes2), or None when two different key tuples share
+    a hash, in which case the caller falls back to the indexed path.
+    """
+    codes1, codes2 = key_codes(df1), key_codes(df2)
+    hashes1 = pd.util.hash_pandas_object(codes1, index=False).to_numpy()
+    hashes2 = pd.util.hash_pandas_object(codes2, index=False).to_numpy()
+
+    # Collision check: every row must carry the same key codes as the first
+    # row seen with its hash (factorize numbers hashes in order of appearance)
+    codes, _ = pd.factorize(np.concatenate([hashes1, hashes2]))
+    first_pos = np.flatnonzero(~pd.Series(codes).duplicated().to_numpy())[codes]
+    for key in csv_primary_keys:
+        values = np.concatenate([codes1[key].to_numpy(), codes2[key].to_numpy()])
+        if (values != values[first_pos]).any():
+            return None
+    return hashes1, hashes2
+
+def compare_key_hashed(df1, df2, plan, file_name, key_hashes, budget):
+    """Align rows on 64-bit primary key hashes with hash tables, no sorting.
+
+    Same yields and return values as compare_indexed. PrimaryKey tuples are only
+    rebuilt for rows that end up in the diff output.
+    """
+    hashes1, hashes2 = key_hashes
+    dup_all1 = pd.Series(hashes1).duplicated(keep=False).to_numpy()
+    dup_all2 = pd.Series(hashes2).duplicated(keep=False).to_numpy()
+    keep1 = np.flatnonzero(~pd.Series(hashes1).duplicated().to_numpy())
+    keep2 = np.flatnonzero(~pd.Series(hashes2).duplicated().to_numpy())
+
+    for df, hashes, dup_all, side in ((df1, hashes1, dup_all1, 'Engine'), (df2, hashes2, dup_all2, 'Neoprice')):
+        if summary_only:
+            break
+        dup_pos = np.flatnonzero(dup_all)
+        group_codes, _ = pd.factorize(hashes[dup_pos])
+        first_pos = dup_pos[np.flatnonzero(~pd.Series(group_codes).duplicated().to_numpy())]
+        yield budget.take(len(first_pos), partial(
+            duplicate_records, rebuild_primary_keys(df, first_pos), df['_original_row'].to_numpy()[dup_pos],
+            group_codes, side
+        ))
+
+    # Align de-duplicated rows through a hash lookup on the integer keys
+    match = pd.Index(hashes2[keep2]).get_indexer(hashes1[keep1])
+    pos1 = keep1[match >= 0]
+    pos2 = keep2[match[match >= 0]]
+    missing_pos = keep1[match < 0]
+    matched2 = np.zeros(len(hashes2), dtype=bool)
+    matched2[pos2] = True
+    extra_pos = keep2[~matched2[keep2]]
+    rekeyed1, rekeyed2 = pair_rekeyed_rows(df1, df2, missing_pos, extra_pos, plan)
+    missing_pos = np.setdiff1d(missing_pos, rekeyed1)
+    extra_pos = np.setdiff1d(extra_pos, rekeyed2)
+
+    if not summary_only:
+        for df, unmatched_pos, side in ((df1, missing_pos, 'Engine'), (df2, extra_pos, 'Neoprice')):
+            def build(positions, df=df, unmatched_pos=unmatched_pos, side=side):
+                rows = unmatched_pos[positions]
+                return unmatched_records(rebuild_primary_keys(df, rows), df['_original_row'].to_numpy()[rows], side)
+            yield budget.take(len(unmatched_pos), build)
+    rekeyed_tallies = yield from rekeyed_records(
+        df1, df2, rekeyed1, rekeyed2, plan, file_name,
+        partial(rebuild_primary_keys, df1), partial(rebuild_primary_keys, df2), budget
+    )
 
-    # Compare common rows
-    common_idx = df1.index.intersection(df2.index)
-    total_fields = 0
-    mismatches = 0
-    discrepant_rows = set()
+    row_has_mismatch, column_tallies, profile_rows = yield from compare_common_rows(
+        df1, df2, pos1, pos2, plan, file_name,
+        lambda rows: rebuild_primary_keys(df1, pos1[rows]), budget
+    )
 
-    for idx in tqdm(common_idx, desc=f"Comparing rows ({file_name})", unit="rows", dynamic_ncols=True, leave=False):
-        if isinstance(df1.index, pd.MultiIndex):
-            row1 = df1.loc[tuple(idx)] if isinstance(idx, (list, tuple)) else df1.loc[idx]
-            row2 = df2.loc[tuple(idx)] if isinstance(idx, (list, tuple)) else df2.loc[idx]
+    def row_discrepancies(mismatch):
+        return len(pd.unique(np.concatenate([
+            hashes1[pos1[mismatch]],
+            hashes1[missing_pos],
+            hashes2[extra_pos],
+            hashes1[rekeyed1],
+            hashes1[dup_all1],
+            hashes2[dup_all2]
+        ])))
+
+    counts = {
+        'Duplicate Rows in Engine': len(hashes1) - len(keep1),
+        'Duplicate Rows in Neoprice': len(hashes2) - len(keep2),
+        'Missing Rows in Neoprice': len(missing_pos),
+        'Extra Rows in Neoprice': len(extra_pos),
+        'Total Fields Compared': len(pos1) * len(plan.common_columns),
+        'Field Mismatches': sum(column_tallies.values()),
+        'Number of Row Discrepancies': row_discrepancies(row_has_mismatch),
+        'Column Mismatches': column_tallies
+    }
+    counts.update(rekeyed_counts(rekeyed1, rekeyed_tallies))
+    counts.update(profile_counts(plan, len(pos1), column_tallies, profile_rows, row_discrepancies))
+    return counts, (len(keep1), len(keep2))
+
+def side_row_hashes(df, columns):
+    """64-bit content hash of each row of one side over the given columns (numbers hashed as float64)"""
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for col in columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind in 'biuf':
+            values = values.astype(np.float64)
+        hashes = (hashes ^ pd.util.hash_array(values)) * ROW_HASH_PRIME
+    return hashes
+
+def longest_increasing_run(values):
+    """Positions of a longest strictly increasing subsequence of values (patience sorting)"""
+    tails, tail_pos = [], []
+    previous = np.full(len(values), -1)
+    for pos, value in enumerate(values):
+        k = bisect.bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_pos.append(pos)
         else:
-            row1 = df1.loc[idx]
-            row2 = df2.loc[idx]
-
-        row1_number = int(row1['_original_row'])
-        row2_number = int(row2['_original_row'])
-
-        row_has_mismatch = False
-        for col in common_columns:
-            val1 = row1.get(col, None)
-            val2 = row2.get(col, None)
-            total_fields += 1
-
-            if not values_equal(val1, val2):
-                mismatches += 1
-                row_has_mismatch = True
-                diff_summary.append({
-                    'PrimaryKey': idx,
-                    'Column': col,
-                    'Engine_Value': val1,
-                    'Neoprice_Value': val2,
-                    'RowNum_Engine': row1_number,
-                    'RowNum_Neoprice': row2_number,
-                    'Status': 'Mismatch'
-                })
-
-        if row_has_mismatch:
-            discrepant_rows.add(idx)
+            tails[k] = value
+            tail_pos[k] = pos
+        previous[pos] = tail_pos[k - 1] if k else -1
+    run = []
+    pos = tail_pos[-1] if tail_pos else -1
+    while pos >= 0:
+        run.append(pos)
+        pos = previous[pos]
+    return np.array(run[::-1], dtype=np.int64)
+
+def expand_ranges(starts, lengths):
+    """Concatenate the integer ranges [start, start + length) as one array"""
+    total = lengths.sum()
+    return np.repeat(starts, lengths) + np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+def align_positions(hashes1, hashes2):
+    """Sequence diff of two row hash arrays.
+
+    Rows whose hash is unique on both sides are anchors; a longest
+    increasing run of them keeps the anchors in order. Between consecutive
+    anchors rows pair up position by position and the surplus of the longer
+    side is a deleted (Engine) or inserted (Neoprice) block. Without
+    insertions or deletions this is exactly row i against row i.
+    Returns (pos1, pos2, deleted, inserted, deleted_blocks, inserted_blocks)
+    with blocks as (start, length) arrays.
+    """
+    counts1 = pd.Series(hashes1).value_counts()
+    counts2 = pd.Series(hashes2).value_counts()
+    unique_both = counts1.index[counts1.to_numpy() == 1].intersection(counts2.index[counts2.to_numpy() == 1])
+    anchors1 = np.flatnonzero(pd.Index(hashes1).isin(unique_both))
+    candidates2 = np.flatnonzero(pd.Index(hashes2).isin(unique_both))
+    anchors2 = candidates2[pd.Index(hashes2[candidates2]).get_indexer(hashes1[anchors1])]
+    if len(anchors2) and not (np.diff(anchors2) > 0).all():
+        run = longest_increasing_run(anchors2.tolist())
+        anchors1, anchors2 = anchors1[run], anchors2[run]
+
+    # Gaps before, between and after the anchors
+    gap_starts1 = np.concatenate([[0], anchors1 + 1])
+    gap_starts2 = np.concatenate([[0], anchors2 + 1])
+    gap_lengths1 = np.concatenate([anchors1, [len(hashes1)]]) - gap_starts1
+    gap_lengths2 = np.concatenate([anchors2, [len(hashes2)]]) - gap_starts2
+    paired = np.minimum(gap_lengths1, gap_lengths2)
+
+    pos1 = np.concatenate([anchors1, expand_ranges(gap_starts1, paired)])
+    pos2 = np.concatenate([anchors2, expand_ranges(gap_starts2, paired)])
+    order = np.argsort(pos1, kind='stable')
+    deleted_blocks = (gap_starts1 + paired, gap_lengths1 - paired)
+    inserted_blocks = (gap_starts2 + paired, gap_lengths2 - paired)
+    return (pos1[order], pos2[order], expand_ranges(*deleted_blocks), expand_ranges(*inserted_blocks),
+            deleted_blocks, inserted_blocks)
+
+def positional_keys(row_numbers, side='Engine'):
+    """PrimaryKey values for keyless files: the row number on the given side"""
+    keys = np.empty(len(row_numbers), dtype=object)
+    keys[:] = [(f"{side} row {row}",) for row in row_numbers]
+    return keys
+
+def compare_positional(df1, df2, plan, file_name, budget):
+    """Compare files without primary key columns row by row.
+
+    Rows are aligned with align_positions over per-row content hashes, so an
+    inserted or deleted block only shifts the alignment instead of turning
+    every later row into a mismatch. Deleted rows are reported as missing in
+    Neoprice, inserted rows as extra. Same yields and return values as
+    compare_indexed.
+    """
+    hashes1 = side_row_hashes(df1, plan.compare_columns)
+    hashes2 = side_row_hashes(df2, plan.compare_columns)
+    pos1, pos2, deleted, inserted, deleted_blocks, inserted_blocks = align_positions(hashes1, hashes2)
+    row_numbers1 = df1['_original_row'].to_numpy()
+    row_numbers2 = df2['_original_row'].to_numpy()
+
+    if not summary_only:
+        for row_numbers, side in ((row_numbers1[deleted], 'Engine'), (row_numbers2[inserted], 'Neoprice')):
+            def build(positions, row_numbers=row_numbers, side=side):
+                return unmatched_records(positional_keys(row_numbers[positions], side), row_numbers[positions], side)
+            yield budget.take(len(row_numbers), build)
+
+    row_has_mismatch, column_tallies, profile_rows = yield from compare_common_rows(
+        df1, df2, pos1, pos2, plan, file_name,
+        lambda rows: positional_keys(row_numbers1[pos1[rows]]), budget
+    )
 
-    # Add rows with missing, extra, or duplicate issues to discrepant_rows
-    discrepant_rows.update(missing_in_neoprice)
-    discrepant_rows.update(extra_in_neoprice)
-    discrepant_rows.update(dup_rows_engine.index)
-    discrepant_rows.update(dup_rows_neoprice.index)
+    def row_discrepancies(mismatch):
+        return int(mismatch.sum()) + len(deleted) + len(inserted)
 
-    summary['Total Fields Compared'] = total_fields
-    summary['Field Mismatches'] = mismatches
-    summary['Number of Row Discrepancies'] = len(discrepant_rows)
+    counts = {
+        'Duplicate Rows in Engine': 0,
+        'Duplicate Rows in Neoprice': 0,
+        'Missing Rows in Neoprice': len(deleted),
+        'Extra Rows in Neoprice': len(inserted),
+        'Total Fields Compared': len(pos1) * len(plan.common_columns),
+        'Field Mismatches': sum(column_tallies.values()),
+        'Number of Row Discrepancies': row_discrepancies(row_has_mismatch),
+        'Column Mismatches': column_tallies,
+        'Deleted Row Blocks': [(int(row_numbers1[start]), int(row_numbers1[start + length - 1]))
+                               for start, length in zip(*deleted_blocks) if length],
+        'Inserted Row Blocks': [(int(row_numbers2[start]), int(row_numbers2[start + length - 1]))
+                                for start, length in zip(*inserted_blocks) if length]
+    }
+    counts.update(profile_counts(plan, len(pos1), column_tallies, profile_rows, row_discrepancies))
+    return counts, (len(df1), len(df2))
 
-    missing_rows = len(missing_in_neoprice)
-    extra_rows = len(extra_in_neoprice)
+def finalize_summary(summary):
+    """Fill in discrepancy totals, percentages and status from the summary counts"""
+    missing_rows = summary['Missing Rows in Neoprice']
+    extra_rows = summary['Extra Rows in Neoprice']
     duplicates = summary['Duplicate Rows in Engine'] + summary['Duplicate Rows in Neoprice']
-    field_mismatches = mismatches
+    field_mismatches = summary['Field Mismatches']
 
-    total_discrepancies = missing_rows + extra_rows + duplicates + field_mismatches
+    rule_violations = summary.get('Rule Violations in Engine', 0) + summary.get('Rule Violations in Neoprice', 0)
+    total_discrepancies = (missing_rows + extra_rows + duplicates + field_mismatches + summary.get('Re-keyed Rows', 0) +
+                           rule_violations)
     summary['Number of Discrepancies'] = total_discrepancies
 
-    total_data_points = len(df1) + len(df2) + total_discrepancies
+    # De-duplicated rows on both sides plus every discrepancy
+    unique_rows = (summary['Total Rows in Engine'] - summary['Duplicate Rows in Engine'] +
+                   summary['Total Rows in Neoprice'] - summary['Duplicate Rows in Neoprice'])
+    total_data_points = unique_rows + total_discrepancies
 
     if total_data_points > 0:
         failure_percent = (total_discrepancies / total_data_points) * 100
@@ -526,10 +1744,995 @@ def compare_csvs(df1, df2, file_name):
     else:
         summary['Status'] = 'PASS'
         summary['Note'] = '✅ No comparison issues, files are identical'
+    return summary
+
+def non_empty_batches(batches):
+    """Pass on the non-empty frames of a diff generator and return its return value"""
+    while True:
+        try:
+            batch = next(batches)
+        except StopIteration as stop:
+            return stop.value
+        if not batch.empty:
+            yield batch
+
+class DiffStream:
+    """Iterable over the diff record batches of one CSV pair.
+
+    Each item is a non-empty DataFrame with DIFF_COLUMNS. summary holds the
+    file summary once the stream is exhausted and is None until then.
+    """
+
+    def __init__(self, df1, df2, file_name, **options):
+        self.file_name = file_name
+        self.summary = None
+        self._batches = iter_compare_csvs(df1, df2, file_name, **options)
+
+    def __iter__(self):
+        self.summary = yield from self._batches
+
+def stream_compare_csvs(df1, df2, file_name, **options):
+    """Compare two CSVs, yielding diff batches as they are produced (see DiffStream)"""
+    return DiffStream(df1, df2, file_name, **options)
+
+def new_file_summary():
+    """Summary of one CSV pair before any comparison"""
+    return {
+        'Missing Columns in Neoprice': [],
+        'Missing Columns in Engine': [],
+        'Missing Rows in Neoprice': 0,
+        'Extra Rows in Neoprice': 0,
+        'Duplicate Rows in Engine': 0,
+        'Duplicate Rows in Neoprice': 0,
+        'Total Fields Compared': 0,
+        'Number of Discrepancies': 0,
+        'Number of Row Discrepancies': 0,
+        'Field Mismatches': 0,
+        'Failure %': 0.0,
+        'Pass %': 0.0,
+        'Row Failure %': 0.0,
+        'Row Pass %': 0.0,
+        'Status': 'PASS',
+        'Total Rows in Engine': 0,
+        'Total Rows in Neoprice': 0,
+        'Column Mismatches': {}
+    }
+
+def iter_compare_csvs(df1, df2, file_name, original_rows=None, partitions=1, budget=None):
+    """Generator behind compare_csvs: yields diff record batches, returns the summary.
+
+    original_rows optionally gives the file row numbers of the rows of df1
+    and df2 when they are one key partition of a larger pair, and
+    partitions the number of such partitions sharing the diff budget. A
+    caller passing its own DiffBudget closes it itself.
+    """
+    summary = new_file_summary()
+
+    # Header-dependent work (projection, column sets, comparators) is cached per layout
+    plan = get_comparison_plan(tuple(df1.columns), tuple(df2.columns))
+    df1 = plan.project(df1, 'Engine')
+    df2 = plan.project(df2, 'Neoprice')
+
+    # Track column differences
+    summary['Missing Columns in Neoprice'] = list(plan.missing_in_neoprice)
+    summary['Missing Columns in Engine'] = list(plan.missing_in_engine)
 
-    diff_df = pd.DataFrame(diff_summary)
+    if not plan.common_columns:
+        logging.info(f"No common columns to compare in {file_name}")
+        return summary
+
+    # Track original row numbers (the index holds file rows, also after row_filter) and reset indices
+    rows1 = df1.index.to_numpy() + 1 if original_rows is None else original_rows[0]
+    rows2 = df2.index.to_numpy() + 1 if original_rows is None else original_rows[1]
+    df1 = df1.reset_index(drop=True)
+    df2 = df2.reset_index(drop=True)
+    df1['_original_row'] = rows1
+    df2['_original_row'] = rows2
+
+    # Add total cleaned row counts to summary
+    summary['Total Rows in Engine'] = len(df1)
+    summary['Total Rows in Neoprice'] = len(df2)
+
+    # Intra-file consistency rules see each side's values before the keys are encoded
+    violations1 = consistency_violations(df1, plan.consistency_rules[0])
+    violations2 = consistency_violations(df2, plan.consistency_rules[1])
+
+    # Clean primary keys and encode them against one shared dictionary per column
+    encode_primary_keys(df1, df2)
+
+    key_hashes = hash_primary_keys(df1, df2) if use_key_hashing and csv_primary_keys else None
+    if use_key_hashing and csv_primary_keys and key_hashes is None:
+        logging.warning(f"Primary key hash collision in {file_name}, using indexed comparison")
+
+    # Detailed records past the per-file budget are only sampled
+    owns_budget = budget is None
+    if owns_budget:
+        budget = DiffBudget(file_name, partitions)
+    if not csv_primary_keys:
+        batches = compare_positional(df1, df2, plan, file_name, budget)
+    elif key_hashes is not None:
+        batches = compare_key_hashed(df1, df2, plan, file_name, key_hashes, budget)
+    else:
+        batches = compare_indexed(df1, df2, plan, file_name, budget)
+    counts, _ = yield from non_empty_batches(batches)
+    summary.update(counts)
+    tallies1 = yield from non_empty_batches(consistency_records(df1, violations1, 'Engine', budget))
+    tallies2 = yield from non_empty_batches(consistency_records(df2, violations2, 'Neoprice', budget))
+    summary.update(consistency_counts(plan, tallies1, tallies2))
+    if owns_budget and budget.excess:
+        yield from budget.close(summary, file_name)
+
+    return finalize_summary(summary)
+
+def compare_csvs(df1, df2, file_name, **options):
+    """Enhanced CSV comparison with detailed discrepancy tracking"""
+    stream = stream_compare_csvs(df1, df2, file_name, **options)
+    diff_frames = list(stream)
+    diff_df = pd.concat(diff_frames, ignore_index=True) if diff_frames else pd.DataFrame(columns=DIFF_COLUMNS)
+    return diff_df, stream.summary
+
+def clean_key_values(values):
+    """(codes, cleaned distinct values) of a key column, cleaned like encode_primary_keys"""
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object), use_na_sentinel=False)
+    return codes, np.array([str(val).strip() for val in uniques], dtype=object)
+
+def key_partitions(df, num_partitions):
+    """Partition number of each row from a hash of its cleaned primary key.
+
+    Keys are cleaned like encode_primary_keys (str + strip, nulls as 'nan')
+    before hashing, so rows with equal keys land in the same partition on
+    both sides and all duplicates of a key share a partition. With the
+    re-key pass enabled only the blocking key columns are hashed, so rows
+    whose key changed can still be paired within their partition.
+    """
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    partition_columns = [key for key in csv_primary_keys if key in rekey_blocking_columns] if rekey_enabled else []
+    for key in partition_columns or csv_primary_keys:
+        codes, cleaned = clean_key_values(df[key])
+        hashes = (hashes ^ pd.util.hash_array(cleaned)[codes]) * ROW_HASH_PRIME
+    return (hashes % np.uint64(num_partitions)).astype(np.int64)
+
+def split_csv_pair(df1, df2, num_partitions):
+    """Split a CSV pair into key partitions: (df1 part, df2 part, (row numbers 1, row numbers 2))"""
+    parts1, parts2 = key_partitions(df1, num_partitions), key_partitions(df2, num_partitions)
+    partitions = []
+    for part in range(num_partitions):
+        rows1, rows2 = np.flatnonzero(parts1 == part), np.flatnonzero(parts2 == part)
+        partitions.append((df1.iloc[rows1], df2.iloc[rows2],
+                           (df1.index.to_numpy()[rows1] + 1, df2.index.to_numpy()[rows2] + 1)))
+    return partitions
+
+def merge_partition_summaries(summaries):
+    """Combine the summaries of the key partitions of one CSV pair.
+
+    Partitions hold disjoint keys, so every count (rows, duplicates,
+    missing, extra, mismatches, row discrepancies) is an exact sum.
+    """
+    if any(part.get('Status') == 'ERROR' for part in summaries):
+        return next(part for part in summaries if part.get('Status') == 'ERROR')
+    summary = dict(summaries[0])
+    for key in ('Missing Rows in Neoprice', 'Extra Rows in Neoprice', 'Duplicate Rows in Engine',
+                'Duplicate Rows in Neoprice', 'Total Fields Compared', 'Number of Row Discrepancies',
+                'Field Mismatches', 'Total Rows in Engine', 'Total Rows in Neoprice'):
+        summary[key] = sum(part.get(key, 0) for part in summaries)
+    for key in ('Re-keyed Rows', 'Re-keyed Field Differences', 'Rule Violations in Engine', 'Rule Violations in Neoprice'):
+        if any(key in part for part in summaries):
+            summary[key] = sum(part.get(key, 0) for part in summaries)
+    for key in ('Column Mismatches', 'Sampled Diff Records', 'Rule Violations'):
+        totals = {}
+        for part in summaries:
+            for name, count in part.get(key, {}).items():
+                totals[name] = totals.get(name, 0) + count
+        summary.pop(key, None)
+        if totals or key == 'Column Mismatches' or (key == 'Rule Violations' and key in summaries[0]):
+            summary[key] = totals
+    if any('Column Profiles' in part for part in summaries):
+        profiles = {}
+        for part in summaries:
+            for name, counts in part.get('Column Profiles', {}).items():
+                total = profiles.setdefault(name, {'Total Fields Compared': 0, 'Field Mismatches': 0,
+                                                   'Number of Row Discrepancies': 0, 'Column Mismatches': {}})
+                for key in ('Total Fields Compared', 'Field Mismatches', 'Number of Row Discrepancies'):
+                    total[key] += counts[key]
+                for col, count in counts['Column Mismatches'].items():
+                    total['Column Mismatches'][col] = total['Column Mismatches'].get(col, 0) + count
+        summary['Column Profiles'] = profiles
+    return finalize_summary(summary)
+
+
+
+'''-----------------------------------
+Out-of-Core Comparison
+------------------------------------'''
+CSV_MEMORY_FACTOR = 4  # Approximate DataFrame size relative to the CSV bytes, used to size partitions
+
+def out_of_core_partitions(csv_bytes1, csv_bytes2):
+    """Number of key partitions so that one partition pair fits the memory budget"""
+    estimated_mb = (csv_bytes1 + csv_bytes2) * CSV_MEMORY_FACTOR / 2**20
+    return max(1, math.ceil(estimated_mb / memory_budget_mb))
+
+def open_zip_for_streaming(zip_key, work_dir, side):
+    """Open a ZIP for chunked reads; S3 objects are downloaded to work_dir instead of memory"""
+    if download_local:
+        return zipfile.ZipFile(zip_key, 'r')
+    local_path = os.path.join(work_dir, f"{side}_{os.path.basename(zip_key)}")
+    s3.download_file(bucket_name, zip_key, local_path)
+    return zipfile.ZipFile(local_path, 'r')
+
+def open_source_zip(zip_key):
+    """Open a source ZIP; S3 objects are read into memory like read_csv_from_zip"""
+    if download_local:
+        return zipfile.ZipFile(zip_key, 'r')
+    return zipfile.ZipFile(io.BytesIO(s3.get_object(Bucket=bucket_name, Key=zip_key)['Body'].read()))
+
+def engine_unsupported():
+    """True when the run uses a feature only compare_csvs implements, so the optional engines fall back to it"""
+    return not csv_primary_keys or rekey_enabled or column_profiles or consistency_rules or row_filter
+
+def streamed_comparison(description, engine=False):
+    """Decorator for the comparisons that read their CSV pair themselves.
+
+    The decorated function takes (normalized_csv_name, zip1, csv1_name,
+    zip2, csv2_name); the wrapper takes the (zip, csv) entries as
+    compare_all_csvs passes them. With engine=True, runs the engine does not
+    support go through compare_csvs instead. Errors are logged with
+    description and returned as an ERROR summary.
+    """
+    def decorate(compare_pair):
+        @wraps(compare_pair)
+        def compare_entries(normalized_csv_name, source1_entry, source2_entry):
+            (zip1, csv1_name), (zip2, csv2_name) = source1_entry, source2_entry
+            try:
+                if engine and engine_unsupported():
+                    with open_source_zip(zip1) as z1, open_source_zip(zip2) as z2:
+                        return compare_csvs(read_csv_member(z1, csv1_name), read_csv_member(z2, csv2_name),
+                                            normalized_csv_name)
+                return compare_pair(normalized_csv_name, zip1, csv1_name, zip2, csv2_name)
+            except Exception as e:
+                thread_safe_print(f"❌ Error comparing {normalized_csv_name} {description}: {e}")
+                logging.error(f"Error comparing {normalized_csv_name} {description}: {e}")
+                return pd.DataFrame(), {'Status': 'ERROR', 'Note': str(e)}
+        return compare_entries
+    return decorate
+
+def spill_partitions(zip_file, csv_filename, num_parts, side_dir):
+    """Stream a CSV out of its ZIP into per-partition spill files on disk.
+
+    Rows are assigned to partitions by key_partitions, so a key and all its
+    duplicates end up in the same partition on both sides. Each file is a
+    sequence of pickled (rows, file row numbers) pairs, starting with an
+    empty frame that carries the columns. Returns the number of rows kept.
+    """
+    os.makedirs(side_dir, exist_ok=True)
+    spill_files = [open(os.path.join(side_dir, f"part_{part}.pkl"), 'wb') for part in range(num_parts)]
+    rows_kept, first_chunk = 0, True
+    try:
+        for chunk in iter_csv_member_chunks(zip_file, csv_filename, read_chunk_rows):
+            if first_chunk:
+                first_chunk = False
+                for f in spill_files:
+                    pickle.dump((chunk.iloc[:0], np.empty(0, dtype=np.int64)), f, protocol=pickle.HIGHEST_PROTOCOL)
+            parts = key_partitions(chunk, num_parts)
+            for part in np.unique(parts):
+                rows = np.flatnonzero(parts == part)
+                pickle.dump((chunk.iloc[rows], chunk.index.to_numpy()[rows] + 1), spill_files[part],
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            rows_kept += len(chunk)
+    finally:
+        for f in spill_files:
+            f.close()
+    return rows_kept
+
+def load_spilled_partition(path):
+    """Read one spill file back as (DataFrame, file row numbers)"""
+    frames, row_numbers = [], []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                frame, rows = pickle.load(f)
+            except EOFError:
+                break
+            frames.append(frame)
+            row_numbers.append(rows)
+    non_empty = [frame for frame in frames if not frame.empty] or frames[:1]
+    return pd.concat(non_empty, ignore_index=True), np.concatenate(row_numbers)
+
+@streamed_comparison("out of core")
+def compare_csv_out_of_core(normalized_csv_name, zip1, csv1_name, zip2, csv2_name):
+    """Grace-hash comparison of one CSV pair without loading either CSV whole.
+
+    Both CSVs are streamed out of their ZIPs in chunks of chunk_rows and
+    hash-partitioned by primary key into spill files, then partition pairs
+    are loaded and compared one at a time. The number of partitions follows
+    from the CSV sizes and memory_budget_mb, so peak memory is about one
+    partition pair plus one read chunk. Partition results are merged exactly
+    as for in-memory key partitions.
+    """
+    work_dir = tempfile.mkdtemp(prefix='csv_compare_', dir=spill_dir)
+    try:
+        with open_zip_for_streaming(zip1, work_dir, 'engine') as z1, open_zip_for_streaming(zip2, work_dir, 'neoprice') as z2:
+            num_parts = out_of_core_partitions(z1.getinfo(csv1_name).file_size, z2.getinfo(csv2_name).file_size)
+            rows1 = spill_partitions(z1, csv1_name, num_parts, os.path.join(work_dir, 'engine'))
+            rows2 = spill_partitions(z2, csv2_name, num_parts, os.path.join(work_dir, 'neoprice'))
+        logging.info(f"Spilled {normalized_csv_name} ({rows1} / {rows2} rows) into {num_parts} partitions")
+
+        diff_frames, summaries = [], []
+        for part in range(num_parts):
+            part_paths = [os.path.join(work_dir, side, f"part_{part}.pkl") for side in ('engine', 'neoprice')]
+            df1, original_rows1 = load_spilled_partition(part_paths[0])
+            df2, original_rows2 = load_spilled_partition(part_paths[1])
+            diff_df, summary = compare_csvs(df1, df2, normalized_csv_name,
+                                            original_rows=(original_rows1, original_rows2), partitions=num_parts)
+            if not diff_df.empty:
+                diff_frames.append(diff_df)
+            summaries.append(summary)
+            del df1, df2
+            for path in part_paths:
+                os.remove(path)
+            gc.collect()
+
+        diff_df = pd.concat(diff_frames, ignore_index=True) if diff_frames else pd.DataFrame(columns=DIFF_COLUMNS)
+        return diff_df, merge_partition_summaries(summaries)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+'''-----------------------------------
+Sorted-Merge Comparison
+------------------------------------'''
+def clean_key_tuples(df):
+    """Cleaned primary key of each row as an object array of tuples, ordered like the strings"""
+    columns = []
+    for key in csv_primary_keys:
+        codes, cleaned = clean_key_values(df[key])
+        columns.append(cleaned[codes])
+    keys = np.empty(len(df), dtype=object)
+    keys[:] = list(zip(*columns))
+    return keys
+
+class SortedCsvReader:
+    """Reads one CSV out of its ZIP in batches, checking that keys never decrease.
+
+    Buffered rows wait until the other side has read past their keys; take
+    hands out the rows that are complete on both sides.
+    """
+
+    def __init__(self, zip_file, csv_filename):
+        self.chunks = iter_csv_member_chunks(zip_file, csv_filename, stream_batch_rows)
+        self.frame = None
+        self.keys = np.empty(0, dtype=object)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.exhausted = False
+
+    def read(self):
+        """Buffer the next batch; returns False as soon as the key order is broken"""
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            return True
+        keys = clean_key_tuples(chunk)
+        if not (keys[:-1] <= keys[1:]).all() or (len(self.keys) and len(keys) and keys[0] < self.keys[-1]):
+            return False
+        self.frame = chunk if self.frame is None or self.frame.empty else pd.concat([self.frame, chunk], ignore_index=True)
+        self.keys = np.concatenate([self.keys, keys])
+        self.rows = np.concatenate([self.rows, chunk.index.to_numpy() + 1])
+        return True
+
+    def take(self, bound):
+        """Remove and return (rows, file row numbers) for keys below bound, everything if bound is None"""
+        end = len(self.keys) if bound is None else bisect.bisect_left(self.keys, bound)
+        taken = (self.frame.iloc[:end], self.rows[:end])
+        self.frame = self.frame.iloc[end:].reset_index(drop=True)
+        self.keys, self.rows = self.keys[end:], self.rows[end:]
+        return taken
+
+def merge_join_sorted(file_name, zip1, csv1_name, zip2, csv2_name):
+    """One forward merge-join pass over two CSVs sorted by primary key.
+
+    Both sides are read stream_batch_rows rows at a time. Once both sides
+    have read past a key, the rows below it are complete (all duplicates
+    included), so each such block is compared on its own with one shared
+    DiffBudget and merged like key partitions. Memory stays around a batch
+    per side. Returns (diff_df, summary), or None as soon as either side is
+    found out of key order.
+    """
+    readers = [SortedCsvReader(zip1, csv1_name), SortedCsvReader(zip2, csv2_name)]
+    budget = DiffBudget(file_name)
+    diff_frames, summaries = [], []
+    while True:
+        # Read on every side whose buffer ends lowest, so equal keys are never split
+        active = [reader for reader in readers if not reader.exhausted]
+        pending = [reader.keys[-1] for reader in active if len(reader.keys)]
+        low = min(pending) if len(pending) == len(active) and pending else None
+        for reader in active:
+            if not len(reader.keys) or reader.keys[-1] == low:
+                if not reader.read():
+                    return None
+        active = [reader for reader in readers if not reader.exhausted]
+        if any(not len(reader.keys) for reader in active):
+            continue
+        bound = min(reader.keys[-1] for reader in active) if active else None
+
+        (df1, rows1), (df2, rows2) = readers[0].take(bound), readers[1].take(bound)
+        if len(df1) or len(df2) or not (active or summaries):
+            diff_df, summary = compare_csvs(df1, df2, file_name, original_rows=(rows1, rows2), budget=budget)
+            if not diff_df.empty:
+                diff_frames.append(diff_df)
+            summaries.append(summary)
+        if not active:
+            break
+
+    if budget.excess:
+        diff_frames.extend(budget.close(summaries[0], file_name))
+    summary = merge_partition_summaries(summaries)
+    diff_df = pd.concat(diff_frames, ignore_index=True) if diff_frames else pd.DataFrame(columns=DIFF_COLUMNS)
     return diff_df, summary
 
+@streamed_comparison("by merge join")
+def compare_csv_sorted_merge(normalized_csv_name, zip1, csv1_name, zip2, csv2_name):
+    """Compare one CSV pair by merge join, falling back to the indexed path for unsorted input"""
+    work_dir = tempfile.mkdtemp(prefix='csv_compare_', dir=spill_dir)
+    try:
+        with open_zip_for_streaming(zip1, work_dir, 'engine') as z1, open_zip_for_streaming(zip2, work_dir, 'neoprice') as z2:
+            result = merge_join_sorted(normalized_csv_name, z1, csv1_name, z2, csv2_name)
+            if result is None:
+                logging.warning(f"{normalized_csv_name} is not sorted by primary key, using the indexed comparison")
+                result = compare_csvs(read_csv_member(z1, csv1_name), read_csv_member(z2, csv2_name), normalized_csv_name)
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+'''-----------------------------------
+Arrow Engine
+------------------------------------'''
+NORMALIZED_NULL_TOKENS = ['null', 'none', 'nan', '']  # normalize_value's null spellings, stripped and lower-cased
+NUMERIC_TEXT_PATTERN = r'^[-+]?(\d+\.\d*|\.\d+)([eE][-+]?\d+)?$|^[-+]?\d+$'  # Text normalize_value turns into a number
+CSV_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                 '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']  # Cells pd.read_csv reads as NaN
+
+def read_arrow_member(zip_file, csv_filename):
+    """Read one CSV from an open ZipFile as an Arrow table of strings, projected like read_csv_member.
+
+    Empty cells and the usual NA spellings are null, as pandas reads them.
+    """
+    with zip_file.open(csv_filename) as f:
+        header = tuple(pd.read_csv(f, nrows=0).columns)
+    usecols = get_read_options(header)['usecols'] or list(header)
+    with zip_file.open(csv_filename) as f:
+        return pa_csv.read_csv(f, convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.string() for col in header}, include_columns=usecols,
+            null_values=CSV_NA_VALUES, strings_can_be_null=True))
+
+def arrow_canonical(column):
+    """normalize_value with Arrow kernels, as (numbers, text).
+
+    Null-like cells are null in both, numeric text has its float value in
+    numbers and any other text is stripped and lower-cased in text.
+    """
+    no_text = pa.scalar(None, pa.string())
+    text = pc.utf8_trim_whitespace(column)
+    lower = pc.utf8_lower(text)
+    is_null = pc.or_kleene(pc.is_null(column), pc.fill_null(pc.is_in(lower, value_set=pa.array(NORMALIZED_NULL_TOKENS)), False))
+    is_number = pc.and_(pc.fill_null(pc.match_substring_regex(text, NUMERIC_TEXT_PATTERN), False), pc.invert(is_null))
+    numbers = pc.cast(pc.if_else(is_number, text, no_text), pa.float64())
+    return numbers, pc.if_else(pc.or_(is_number, is_null), no_text, lower)
+
+def arrow_mismatch(column1, column2):
+    """Boolean mask of the aligned cells whose normalized values differ"""
+    numbers1, text1 = arrow_canonical(column1)
+    numbers2, text2 = arrow_canonical(column2)
+    both_null = pc.and_(pc.and_(pc.is_null(numbers1), pc.is_null(text1)),
+                        pc.and_(pc.is_null(numbers2), pc.is_null(text2)))
+    equal = pc.or_(pc.or_(pc.fill_null(pc.equal(numbers1, numbers2), False),
+                          pc.fill_null(pc.equal(text1, text2), False)), both_null)
+    return ~equal.to_numpy(zero_copy_only=False)
+
+def arrow_object_values(column):
+    """Object array of an Arrow column with nulls as NaN, as pandas reads them"""
+    values = column.to_numpy(zero_copy_only=False).astype(object)
+    values[pd.isna(values)] = np.nan
+    return values
+
+def arrow_key_groups(table):
+    """Cleaned key columns of a table and one row per distinct key.
+
+    Keys are stripped and nulls become 'nan', as in encode_primary_keys.
+    Returns (key_table, groups): the cleaned keys with each row's position
+    in '_row', and per key its first row ('_row_min') and row count.
+    """
+    keys = {f'_key{i}': pc.fill_null(pc.utf8_trim_whitespace(table[key]), 'nan')
+            for i, key in enumerate(csv_primary_keys)}
+    key_table = pa.table({**keys, '_row': pa.array(np.arange(table.num_rows, dtype=np.int64))})
+    return key_table, key_table.group_by(list(keys)).aggregate([('_row', 'min'), ('_row', 'count')])
+
+def arrow_key_values(key_arrays, rows):
+    """PrimaryKey values (tuple, or scalar for a single key) like rebuild_primary_keys"""
+    if len(key_arrays) == 1:
+        return key_arrays[0][rows]
+    keys = np.empty(len(rows), dtype=object)
+    keys[:] = list(zip(*(values[rows] for values in key_arrays)))
+    return keys
+
+def arrow_duplicates(key_table, groups):
+    """Duplicated keys of one side as (first rows, their rows in file order, group numbers).
+
+    The last two are None in summary_only mode or when no key repeats.
+    """
+    dup_groups = groups.filter(pc.greater(groups['_row_count'], 1))
+    dup_firsts = np.sort(dup_groups['_row_min'].to_numpy())
+    if summary_only or not len(dup_firsts):
+        return dup_firsts, None, None
+    # Every row of a duplicated key with the first row of its key, in file order,
+    # so factorize numbers the groups like dup_firsts
+    key_names = [name for name in key_table.column_names if name != '_row']
+    dup_rows = key_table.join(dup_groups.select(key_names + ['_row_min']), keys=key_names,
+                              join_type='inner').sort_by('_row')
+    group_codes, _ = pd.factorize(dup_rows['_row_min'].to_numpy())
+    return dup_firsts, dup_rows['_row'].to_numpy(), group_codes
+
+def engine_diff_results(file_name, plan, summary, key_values, duplicates, rows1, rows2, column_mismatch, column_values):
+    """Diff records and summary of a pair aligned by the Arrow, Polars or DuckDB engine.
+
+    key_values(side, rows) returns the PrimaryKey values of rows of a side
+    and duplicates holds the (first rows, rows, group numbers) of each
+    side's duplicated keys.
+    rows1/rows2 are the first Engine/Neoprice row of every distinct key of
+    the full outer join, -1 where a side lacks the key.
+    column_mismatch(col, pos1, pos2) returns the kernel mismatch mask of the
+    matched rows, or None for columns left to the plan's comparator, and
+    column_values(side, col, rows) the cells of a side ('Engine' or
+    'Neoprice') as an object array. Records are produced in the same order
+    and under the same DiffBudget as compare_csvs; returns (diff_df, summary).
+    """
+    budget = DiffBudget(file_name)
+    diff_frames = []
+    if not summary_only:
+        for (dup_firsts, dup_rows, group_codes), side in zip(duplicates, ('Engine', 'Neoprice')):
+            if len(dup_firsts):
+                diff_frames.append(budget.take(len(dup_firsts), partial(
+                    duplicate_records, key_values(side, dup_firsts), dup_rows + 1, group_codes, side
+                )))
+
+    matched = (rows1 >= 0) & (rows2 >= 0)
+    order = np.argsort(rows1[matched])
+    pos1, pos2 = rows1[matched][order], rows2[matched][order]
+    missing_pos = np.sort(rows1[rows2 < 0])
+    extra_pos = np.sort(rows2[rows1 < 0])
+    if not summary_only:
+        for unmatched_pos, side in ((missing_pos, 'Engine'), (extra_pos, 'Neoprice')):
+            def build(positions, unmatched_pos=unmatched_pos, side=side):
+                rows = unmatched_pos[positions]
+                return unmatched_records(key_values(side, rows), rows + 1, side)
+            diff_frames.append(budget.take(len(unmatched_pos), build))
+
+    def mismatch_records(rows, cols, engine_values, neoprice_values):
+        return pd.DataFrame({
+            'PrimaryKey': key_values('Engine', pos1[rows]),
+            'Column': np.asarray(plan.compare_columns, dtype=object)[cols],
+            'Engine_Value': engine_values,
+            'Neoprice_Value': neoprice_values,
+            'RowNum_Engine': pos1[rows] + 1,
+            'RowNum_Neoprice': pos2[rows] + 1,
+            'Status': 'Mismatch'
+        })
+
+    norm_memo = {}
+    row_has_mismatch = np.zeros(len(pos1), dtype=bool)
+    column_tallies = {}
+    hit_rows, hit_cols, engine_values, neoprice_values = [], [], [], []
+    for col_pos, col in enumerate(plan.compare_columns):
+        mismatch = column_mismatch(col, pos1, pos2)
+        if mismatch is None:
+            mismatch = ~plan.comparators[col](column_values('Engine', col, pos1), column_values('Neoprice', col, pos2), norm_memo)
+        hits = np.flatnonzero(mismatch)
+        if col in plan.tolerances and len(hits):
+            atol, rtol = plan.tolerances[col]
+            if atol == 'cur':
+                atol = currency_tolerance(column_values('Engine', plan.currency_column, pos1[hits])
+                                          if plan.currency_column in plan.projection1 else np.full(len(hits), None))
+            hits = hits[~within_tolerance(column_values('Engine', col, pos1[hits]),
+                                          column_values('Neoprice', col, pos2[hits]), atol, rtol)]
+        if not len(hits):
+            continue
+        row_has_mismatch[hits] = True
+        column_tallies[col] = len(hits)
+        if summary_only:
+            continue
+        values1 = column_values('Engine', col, pos1[hits])
+        values2 = column_values('Neoprice', col, pos2[hits])
+        keep, sample, keys = budget.split(len(hits), col)
+        if len(sample):
+            budget.offer(mismatch_records(hits[sample], np.full(len(sample), col_pos), values1[sample], values2[sample]), keys)
+        hit_rows.append(hits[keep])
+        hit_cols.append(np.full(len(keep), col_pos))
+        engine_values.append(values1[keep])
+        neoprice_values.append(values2[keep])
+    if hit_rows:
+        # Row-major order (row by row, columns in compare order) as in compare_common_rows
+        rows = np.concatenate(hit_rows)
+        cols = np.concatenate(hit_cols)
+        order = np.lexsort((cols, rows))
+        diff_frames.append(mismatch_records(rows[order], cols[order], np.concatenate(engine_values)[order],
+                                            np.concatenate(neoprice_values)[order]))
+
+    # Joined rows number the distinct keys of both sides for the row discrepancy count
+    key_ids1 = np.full(summary['Total Rows in Engine'], -1)
+    key_ids1[rows1[rows1 >= 0]] = np.flatnonzero(rows1 >= 0)
+    key_ids2 = np.full(summary['Total Rows in Neoprice'], -1)
+    key_ids2[rows2[rows2 >= 0]] = np.flatnonzero(rows2 >= 0)
+    discrepant_rows = pd.unique(np.concatenate([
+        key_ids1[pos1[row_has_mismatch]],
+        key_ids1[missing_pos],
+        key_ids2[extra_pos],
+        key_ids1[duplicates[0][0]],
+        key_ids2[duplicates[1][0]]
+    ]))
+
+    summary.update({
+        'Duplicate Rows in Engine': summary['Total Rows in Engine'] - int((rows1 >= 0).sum()),
+        'Duplicate Rows in Neoprice': summary['Total Rows in Neoprice'] - int((rows2 >= 0).sum()),
+        'Missing Rows in Neoprice': len(missing_pos),
+        'Extra Rows in Neoprice': len(extra_pos),
+        'Total Fields Compared': len(pos1) * len(plan.common_columns),
+        'Field Mismatches': sum(column_tallies.values()),
+        'Number of Row Discrepancies': len(discrepant_rows),
+        'Column Mismatches': column_tallies
+    })
+    if budget.excess:
+        diff_frames.extend(budget.close(summary, file_name))
+    diff_frames = [frame for frame in diff_frames if not frame.empty]
+    diff_df = pd.concat(diff_frames, ignore_index=True) if diff_frames else pd.DataFrame(columns=DIFF_COLUMNS)
+    return diff_df, finalize_summary(summary)
+
+def compare_tables_arrow(table1, table2, file_name):
+    """Compare two Arrow tables of CSV text like compare_csvs.
+
+    Keys are de-duplicated with an Arrow group-by and aligned with a full
+    outer hash join; columns are compared with compute kernels, which run
+    without the GIL. Columns with an ATPCO field parser keep their Python
+    comparator, and tolerances are applied to the mismatching cells only.
+    Returns (diff_df, summary) with the same schema as compare_csvs.
+    """
+    summary = new_file_summary()
+    plan = get_comparison_plan(tuple(table1.column_names), tuple(table2.column_names))
+    summary['Missing Columns in Neoprice'] = list(plan.missing_in_neoprice)
+    summary['Missing Columns in Engine'] = list(plan.missing_in_engine)
+    if not plan.common_columns:
+        logging.info(f"No common columns to compare in {file_name}")
+        return pd.DataFrame(columns=DIFF_COLUMNS), summary
+    summary['Total Rows in Engine'] = table1.num_rows
+    summary['Total Rows in Neoprice'] = table2.num_rows
+
+    key_table1, groups1 = arrow_key_groups(table1)
+    key_table2, groups2 = arrow_key_groups(table2)
+    key_names = [name for name in key_table1.column_names if name != '_row']
+
+    # Full outer hash join of the distinct keys, each represented by its first row
+    joined = groups1.select(key_names + ['_row_min']).rename_columns(key_names + ['_row1']).join(
+        groups2.select(key_names + ['_row_min']).rename_columns(key_names + ['_row2']),
+        keys=key_names, join_type='full outer')
+
+    tables = {'Engine': table1, 'Neoprice': table2}
+    key_arrays = {'Engine': [key_table1[name].to_numpy() for name in key_names],
+                  'Neoprice': [key_table2[name].to_numpy() for name in key_names]}
+
+    def column_mismatch(col, pos1, pos2):
+        if plan.comparators[col] is not values_equal_array:
+            return None
+        return arrow_mismatch(table1[col].take(pa.array(pos1)), table2[col].take(pa.array(pos2)))
+
+    def column_values(side, col, rows):
+        return arrow_object_values(tables[side][col].take(pa.array(rows)))
+
+    return engine_diff_results(
+        file_name, plan, summary, lambda side, rows: arrow_key_values(key_arrays[side], rows),
+        (arrow_duplicates(key_table1, groups1), arrow_duplicates(key_table2, groups2)),
+        pc.fill_null(joined['_row1'], -1).to_numpy(), pc.fill_null(joined['_row2'], -1).to_numpy(),
+        column_mismatch, column_values
+    )
+
+@streamed_comparison("on the Arrow engine", engine=True)
+def compare_csv_arrow(normalized_csv_name, zip1, csv1_name, zip2, csv2_name):
+    """Compare one CSV pair on the Arrow engine (compare_csvs when engine_unsupported)"""
+    with open_source_zip(zip1) as z1, open_source_zip(zip2) as z2:
+        return compare_tables_arrow(read_arrow_member(z1, csv1_name), read_arrow_member(z2, csv2_name),
+                                    normalized_csv_name)
+
+
+'''-----------------------------------
+Polars Engine
+------------------------------------'''
+def scan_polars_member(zip_file, csv_filename):
+    """Lazy Polars scan of one CSV from an open ZipFile, all columns as strings and projected like read_csv_member"""
+    with zip_file.open(csv_filename) as f:
+        header = tuple(pd.read_csv(f, nrows=0).columns)
+    usecols = get_read_options(header)['usecols'] or list(header)
+    return pl.scan_csv(io.BytesIO(zip_file.read(csv_filename)), infer_schema=False,
+                       null_values=CSV_NA_VALUES).select(usecols)
+
+def polars_canonical(frame, names):
+    """normalize_value with Polars expressions, like arrow_canonical.
+
+    Adds '{name}_n' (float value of numeric text) and '{name}_t' (other text,
+    stripped and lower-cased) for each column in names; null-like cells are
+    null in both. Stages are materialized in turn so no expression is
+    evaluated twice.
+    """
+    frame = frame.with_columns(pl.col(name).str.strip_chars() for name in names).with_columns(
+        *(pl.col(name).str.to_lowercase().alias(f'{name}_l') for name in names),
+        *(pl.col(name).str.contains(NUMERIC_TEXT_PATTERN).alias(f'{name}_r') for name in names)
+    )
+    return frame.with_columns(
+        *(pl.when(pl.col(f'{name}_r')).then(pl.col(name).cast(pl.Float64, strict=False)).alias(f'{name}_n')
+          for name in names),
+        *(pl.when(~pl.col(f'{name}_r') & ~pl.col(f'{name}_l').is_in(NORMALIZED_NULL_TOKENS)).then(pl.col(f'{name}_l'))
+          .alias(f'{name}_t') for name in names)
+    )
+
+def polars_mismatch(numbers1, text1, numbers2, text2):
+    """Expression that is True where two aligned columns' canonical values (from polars_canonical) differ"""
+    both_null = numbers1.is_null() & text1.is_null() & numbers2.is_null() & text2.is_null()
+    return ~((numbers1 == numbers2).fill_null(False) | (text1 == text2).fill_null(False) | both_null)
+
+def polars_object_values(series):
+    """Object array of a Polars string column with nulls as NaN, as pandas reads them"""
+    values = series.to_numpy().astype(object)
+    values[pd.isna(values)] = np.nan
+    return values
+
+def compare_frames_polars(scan1, scan2, file_name):
+    """Compare two lazy Polars scans of CSV text like compare_csvs.
+
+    Key cleaning, duplicate detection, the full outer join of the distinct
+    keys and the inequality of every kernel column run as one lazy query
+    plan, collected together so Polars can share scans and its thread pool.
+    Columns with an ATPCO field parser and tolerances are settled by the
+    same code as the Arrow engine. Returns (diff_df, summary) with the same
+    schema as compare_csvs.
+    """
+    summary = new_file_summary()
+    plan = get_comparison_plan(tuple(scan1.collect_schema().names()), tuple(scan2.collect_schema().names()))
+    summary['Missing Columns in Neoprice'] = list(plan.missing_in_neoprice)
+    summary['Missing Columns in Engine'] = list(plan.missing_in_engine)
+    if not plan.common_columns:
+        logging.info(f"No common columns to compare in {file_name}")
+        return pd.DataFrame(columns=DIFF_COLUMNS), summary
+
+    # Subplans feeding several outputs are cached so each file is scanned and grouped once
+    scan1, scan2 = scan1.cache(), scan2.cache()
+
+    # Stripped keys with nulls as 'nan', as in encode_primary_keys, next to each row's position
+    key_names = [f'_key{i}' for i in range(len(csv_primary_keys))]
+    keyed1, keyed2 = (scan.with_row_index('_row').select(
+        pl.col('_row').cast(pl.Int64),
+        *(pl.col(key).str.strip_chars().fill_null('nan').alias(name) for key, name in zip(csv_primary_keys, key_names))
+    ).cache() for scan in (scan1, scan2))
+    groups1, groups2 = (keyed.group_by(key_names).agg(pl.col('_row').min().alias('_first'), pl.len().alias('_count'))
+                        .cache() for keyed in (keyed1, keyed2))
+
+    # Full outer join of the distinct keys, each represented by its first row
+    joined = groups1.select(*key_names, pl.col('_first').alias('_row1')).join(
+        groups2.select(*key_names, pl.col('_first').alias('_row2')), on=key_names, how='full', coalesce=True
+    ).select(pl.col('_row1').fill_null(-1), pl.col('_row2').fill_null(-1)).cache()
+
+    # Kernel mismatch masks of the matched keys, in Engine row order like engine_diff_results.
+    # Only cells whose text differs are normalized; identical text always compares equal.
+    kernel_columns = [col for col in plan.compare_columns if plan.comparators[col] is values_equal_array]
+    cell_pairs = [(f'_e{i}', f'_n{i}') for i in range(len(kernel_columns))]
+    matched = joined.filter((pl.col('_row1') >= 0) & (pl.col('_row2') >= 0)).join(
+        scan1.with_row_index('_row1').select(pl.col('_row1').cast(pl.Int64),
+                                             *(pl.col(col).alias(f'_e{i}') for i, col in enumerate(kernel_columns))),
+        on='_row1'
+    ).join(
+        scan2.with_row_index('_row2').select(pl.col('_row2').cast(pl.Int64),
+                                             *(pl.col(col).alias(f'_n{i}') for i, col in enumerate(kernel_columns))),
+        on='_row2'
+    ).with_columns(
+        pl.col(name1).ne_missing(pl.col(name2)).alias(f'{name1}_d') for name1, name2 in cell_pairs
+    ).with_columns(
+        pl.when(pl.col(f'{name1}_d')).then(pl.col(name)).alias(name) for name1, name2 in cell_pairs for name in (name1, name2)
+    )
+    matched = polars_canonical(matched, [name for pair in cell_pairs for name in pair]).select(
+        '_row1', *((pl.col(f'{name1}_d') & polars_mismatch(pl.col(f'{name1}_n'), pl.col(f'{name1}_t'),
+                                                           pl.col(f'{name2}_n'), pl.col(f'{name2}_t'))).alias(col)
+                   for (name1, name2), col in zip(cell_pairs, kernel_columns))
+    ).sort('_row1')
+
+    # Every row of a duplicated key with the first row of its key, in file order
+    dups1, dups2 = (keyed.join(groups.filter(pl.col('_count') > 1).select(*key_names, '_first'), on=key_names)
+                    .select('_row', '_first').sort('_row') for keyed, groups in ((keyed1, groups1), (keyed2, groups2)))
+
+    frame1, frame2, keys1, keys2, joined, matched, dups1, dups2 = pl.collect_all(
+        [scan1, scan2, keyed1.select(key_names), keyed2.select(key_names), joined, matched, dups1, dups2])
+    summary['Total Rows in Engine'] = frame1.height
+    summary['Total Rows in Neoprice'] = frame2.height
+
+    def duplicates(dups):
+        dup_firsts = np.sort(dups['_first'].unique().to_numpy())
+        if summary_only or not len(dup_firsts):
+            return dup_firsts, None, None
+        group_codes, _ = pd.factorize(dups['_first'].to_numpy())
+        return dup_firsts, dups['_row'].to_numpy(), group_codes
+
+    frames = {'Engine': frame1, 'Neoprice': frame2}
+    key_arrays = {'Engine': [keys1[name].to_numpy() for name in key_names],
+                  'Neoprice': [keys2[name].to_numpy() for name in key_names]}
+
+    def column_mismatch(col, pos1, pos2):
+        return matched[col].to_numpy() if col in kernel_columns else None
+
+    def column_values(side, col, rows):
+        return polars_object_values(frames[side][col].gather(rows))
+
+    return engine_diff_results(
+        file_name, plan, summary, lambda side, rows: arrow_key_values(key_arrays[side], rows),
+        (duplicates(dups1), duplicates(dups2)),
+        joined['_row1'].to_numpy(), joined['_row2'].to_numpy(),
+        column_mismatch, column_values
+    )
+
+@streamed_comparison("on the Polars engine", engine=True)
+def compare_csv_polars(normalized_csv_name, zip1, csv1_name, zip2, csv2_name):
+    """Compare one CSV pair on the Polars engine (compare_csvs when engine_unsupported)"""
+    with open_source_zip(zip1) as z1, open_source_zip(zip2) as z2:
+        return compare_frames_polars(scan_polars_member(z1, csv1_name), scan_polars_member(z2, csv2_name),
+                                     normalized_csv_name)
+
+
+'''-----------------------------------
+DuckDB Engine
+------------------------------------'''
+DUCKDB_WHITESPACE = " \t\n\r\x0b\x0c"  # Characters str.strip removes from keys and cells
+
+def sql_literal(value):
+    """A Python string as a SQL string literal"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def sql_name(column):
+    """A column name as a quoted SQL identifier"""
+    return '"' + str(column).replace('"', '""') + '"'
+
+def load_duckdb_member(con, table, zip_file, csv_filename, work_dir):
+    """Load one CSV from an open ZipFile into a DuckDB table of strings, projected like read_csv_member.
+
+    The member is streamed to work_dir first so DuckDB can scan it in
+    parallel; rows keep file order, so rowid is the 0-based file row.
+    Returns the loaded column names.
+    """
+    with zip_file.open(csv_filename) as f:
+        header = tuple(pd.read_csv(f, nrows=0).columns)
+    usecols = get_read_options(header)['usecols'] or list(header)
+    csv_path = os.path.join(work_dir, f"{table}.csv")
+    with zip_file.open(csv_filename) as src, open(csv_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    con.execute(
+        f"CREATE TABLE {table} AS SELECT {', '.join(map(sql_name, usecols))} FROM read_csv({sql_literal(csv_path)}, "
+        f"header = true, all_varchar = true, delim = ',', quote = '\"', escape = '\"', "
+        f"names = [{', '.join(map(sql_literal, header))}], nullstr = [{', '.join(map(sql_literal, CSV_NA_VALUES))}])"
+    )
+    os.remove(csv_path)
+    return usecols
+
+def create_duckdb_macros(con):
+    """normalize_value as SQL macros: canon_num is the value of numeric text, canon_text any other text lower-cased"""
+    trimmed = f"trim(x, {sql_literal(DUCKDB_WHITESPACE)})"
+    is_number = f"regexp_matches({trimmed}, {sql_literal(NUMERIC_TEXT_PATTERN)})"
+    con.execute(f"CREATE MACRO canon_num(x) AS CASE WHEN {is_number} THEN TRY_CAST({trimmed} AS DOUBLE) END")
+    con.execute(f"CREATE MACRO canon_text(x) AS CASE WHEN NOT {is_number} AND lower({trimmed}) NOT IN "
+                f"({', '.join(map(sql_literal, NORMALIZED_NULL_TOKENS))}) THEN lower({trimmed}) END")
+
+def duckdb_fetch_rows(con, table, columns, rows):
+    """Columns of the given table rows, in the order of rows, as a DataFrame"""
+    con.register('_positions', pd.DataFrame({'_row': rows, '_order': np.arange(len(rows))}))
+    try:
+        return con.execute(f"SELECT {', '.join('t.' + sql_name(col) for col in columns)} FROM _positions p "
+                           f"JOIN {table} t ON t.rowid = p._row ORDER BY p._order").df()
+    finally:
+        con.unregister('_positions')
+
+def compare_tables_duckdb(con, columns1, columns2, file_name):
+    """Compare the DuckDB tables engine and neoprice like compare_csvs.
+
+    Keys are cleaned and grouped, distinct keys are aligned with a SQL full
+    outer join and kernel columns are compared in SQL, so only rows with a
+    mismatch, the join positions and the cells of reported rows are fetched
+    into Python. DuckDB works within memory_limit and spills to its temp
+    directory past it. Returns (diff_df, summary) with the same schema as
+    compare_csvs.
+    """
+    summary = new_file_summary()
+    plan = get_comparison_plan(tuple(columns1), tuple(columns2))
+    summary['Missing Columns in Neoprice'] = list(plan.missing_in_neoprice)
+    summary['Missing Columns in Engine'] = list(plan.missing_in_engine)
+    if not plan.common_columns:
+        logging.info(f"No common columns to compare in {file_name}")
+        return pd.DataFrame(columns=DIFF_COLUMNS), summary
+    summary['Total Rows in Engine'] = con.execute("SELECT count(*) FROM engine").fetchone()[0]
+    summary['Total Rows in Neoprice'] = con.execute("SELECT count(*) FROM neoprice").fetchone()[0]
+
+    # Stripped keys with nulls as 'nan', as in encode_primary_keys, and per key its first row and row count
+    key_names = [f'_key{i}' for i in range(len(csv_primary_keys))]
+    for table, keys, groups in (('engine', 'keys1', 'groups1'), ('neoprice', 'keys2', 'groups2')):
+        con.execute(f"CREATE TABLE {keys} AS SELECT rowid AS _row, " + ', '.join(
+            f"coalesce(trim({sql_name(key)}, {sql_literal(DUCKDB_WHITESPACE)}), 'nan') AS {name}"
+            for key, name in zip(csv_primary_keys, key_names)) + f" FROM {table}")
+        con.execute(f"CREATE TABLE {groups} AS SELECT {', '.join(key_names)}, min(_row) AS _first, count(*) AS _count "
+                    f"FROM {keys} GROUP BY ALL")
+
+    # Full outer join of the distinct keys, each represented by its first row
+    con.execute("CREATE TABLE joined AS SELECT coalesce(g1._first, -1) AS _row1, coalesce(g2._first, -1) AS _row2 "
+                "FROM groups1 g1 FULL OUTER JOIN groups2 g2 ON " +
+                ' AND '.join(f"g1.{name} = g2.{name}" for name in key_names))
+    joined = con.execute("SELECT _row1, _row2 FROM joined").fetchnumpy()
+
+    def duplicates(keys, groups):
+        dup_firsts = np.sort(con.execute(f"SELECT _first FROM {groups} WHERE _count > 1").fetchnumpy()['_first'])
+        if summary_only or not len(dup_firsts):
+            return dup_firsts, None, None
+        dups = con.execute(f"SELECT k._row, g._first FROM {keys} k JOIN {groups} g USING ({', '.join(key_names)}) "
+                           "WHERE g._count > 1 ORDER BY k._row").fetchnumpy()
+        group_codes, _ = pd.factorize(dups['_first'])
+        return dup_firsts, dups['_row'], group_codes
+
+    # Matched rows with at least one kernel mismatch, and which columns differ
+    kernel_columns = [col for col in plan.compare_columns if plan.comparators[col] is values_equal_array]
+    mismatches = {}
+    if kernel_columns:
+        flags = [f"e.{sql_name(col)} IS DISTINCT FROM n.{sql_name(col)} AND "
+                 f"(canon_num(e.{sql_name(col)}) IS DISTINCT FROM canon_num(n.{sql_name(col)}) OR "
+                 f"canon_text(e.{sql_name(col)}) IS DISTINCT FROM canon_text(n.{sql_name(col)})) AS _m{i}"
+                 for i, col in enumerate(kernel_columns)]
+        mismatches = con.execute(
+            f"SELECT * FROM (SELECT j._row1, {', '.join(flags)} FROM joined j "
+            "JOIN engine e ON e.rowid = j._row1 JOIN neoprice n ON n.rowid = j._row2) "
+            f"WHERE {' OR '.join(f'_m{i}' for i in range(len(kernel_columns)))} ORDER BY _row1"
+        ).fetchnumpy()
+
+    tables = {'Engine': ('engine', 'keys1'), 'Neoprice': ('neoprice', 'keys2')}
+
+    def key_values(side, rows):
+        keys = duckdb_fetch_rows(con, tables[side][1], key_names, rows)
+        return arrow_key_values([keys[name].to_numpy(dtype=object) for name in key_names], np.arange(len(rows)))
+
+    def column_mismatch(col, pos1, pos2):
+        if col not in kernel_columns:
+            return None
+        mismatch = np.zeros(len(pos1), dtype=bool)
+        flagged = mismatches[f'_m{kernel_columns.index(col)}']
+        mismatch[np.searchsorted(pos1, mismatches['_row1'][flagged])] = True
+        return mismatch
+
+    def column_values(side, col, rows):
+        values = duckdb_fetch_rows(con, tables[side][0], [col], rows)[col].to_numpy(dtype=object)
+        values[pd.isna(values)] = np.nan
+        return values
+
+    return engine_diff_results(
+        file_name, plan, summary, key_values,
+        (duplicates('keys1', 'groups1'), duplicates('keys2', 'groups2')),
+        joined['_row1'], joined['_row2'],
+        column_mismatch, column_values
+    )
+
+@streamed_comparison("on the DuckDB engine", engine=True)
+def compare_csv_duckdb(normalized_csv_name, zip1, csv1_name, zip2, csv2_name):
+    """Compare one CSV pair in an embedded DuckDB database.
+
+    Each pair gets its own in-process database limited to memory_budget_mb
+    and spilling to a work directory under spill_dir. Runs the engine does
+    not support (engine_unsupported) go through compare_csvs instead.
+    """
+    work_dir = tempfile.mkdtemp(prefix='csv_compare_', dir=spill_dir)
+    try:
+        with duckdb.connect(config={'memory_limit': f'{memory_budget_mb}MB', 'temp_directory': work_dir}) as con:
+            with open_zip_for_streaming(zip1, work_dir, 'engine') as z1, open_zip_for_streaming(zip2, work_dir, 'neoprice') as z2:
+                columns1 = load_duckdb_member(con, 'engine', z1, csv1_name, work_dir)
+                columns2 = load_duckdb_member(con, 'neoprice', z2, csv2_name, work_dir)
+            create_duckdb_macros(con)
+            return compare_tables_duckdb(con, columns1, columns2, normalized_csv_name)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 
 '''-----------------------------------
@@ -577,6 +2780,7 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
     # Initialize chunk management with Manager dictionaries
     current_chunk_source1 = manager.dict()  # Shared cache for source1 CSVs
     current_chunk_source2 = manager.dict()  # Shared cache for source2 CSVs
+    large_pairs = {}  # normalized CSV name -> key partitions of pairs too large for one process
 
     def load_new_chunk(csv_names, source_name):
         """Load a new chunk of CSVs into shared Manager dictionaries."""
@@ -585,6 +2789,7 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
         # Clear existing chunk
         current_chunk_source1.clear()
         current_chunk_source2.clear()
+        large_pairs.clear()
         gc.collect()
 
         # Select CSVs for the chunk
@@ -599,26 +2804,75 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
                 chunk_csv_pairs_source2.append((zip_key, orig_name))
 
         # Read the chunk
+        chunk_data1 = chunk_data2 = {}
         if chunk_csv_pairs_source1:
-            chunk_data = read_csv_chunk(
+            chunk_data1 = read_csv_chunk(
                 chunk_csv_pairs_source1, f"{source_name}_source1", download_local, use_multithreading
             )
-            for k, v in chunk_data.items():
-                current_chunk_source1[k] = v
         if chunk_csv_pairs_source2:
-            chunk_data = read_csv_chunk(
+            chunk_data2 = read_csv_chunk(
                 chunk_csv_pairs_source2, f"{source_name}_source2", download_local, use_multithreading
             )
+
+        # Build each layout's ComparisonPlan here, so the worker pool is seeded with it instead of rebuilding it per batch
+        for csv_name in csv_names:
+            if csv_name in source1_csv_map and csv_name in source2_csv_map:
+                df1 = chunk_data1.get(source1_csv_map[csv_name][1])
+                df2 = chunk_data2.get(source2_csv_map[csv_name][1])
+                if df1 is not None and df2 is not None:
+                    get_comparison_plan(tuple(df1.columns), tuple(df2.columns))
+
+        # Split very large pairs by primary key hash so their partitions spread over the pool
+        if use_multithreading and csv_primary_keys and partition_rows and num_partitions > 1:
+            for csv_name in csv_names:
+                if csv_name not in source1_csv_map or csv_name not in source2_csv_map:
+                    continue
+                df1 = chunk_data1.get(source1_csv_map[csv_name][1])
+                df2 = chunk_data2.get(source2_csv_map[csv_name][1])
+                if df1 is not None and df2 is not None and max(len(df1), len(df2)) >= partition_rows:
+                    large_pairs[csv_name] = split_csv_pair(df1, df2, num_partitions)
+                    logging.info(f"Split {csv_name} into {num_partitions} key partitions")
+
+        large_csvs = ({source1_csv_map[csv_name][1] for csv_name in large_pairs},
+                      {source2_csv_map[csv_name][1] for csv_name in large_pairs})
+        for chunk_data, current_chunk, skipped in ((chunk_data1, current_chunk_source1, large_csvs[0]),
+                                                   (chunk_data2, current_chunk_source2, large_csvs[1])):
             for k, v in chunk_data.items():
-                current_chunk_source2[k] = v
+                if k not in skipped:
+                    current_chunk[k] = v
 
         chunk_index += 1
         logging.info(f"Loaded chunk {chunk_index} ({len(csv_names)} CSVs) for {source_name}")
 
     try:
+        # Out-of-core, sorted-merge, Arrow, Polars and DuckDB modes read each pair themselves instead of loading chunks
+        streamed = out_of_core or sorted_merge or compare_engine in ('arrow', 'polars', 'duckdb')
+        if streamed:
+            compare_streamed = (compare_csv_out_of_core if out_of_core else
+                                compare_csv_sorted_merge if sorted_merge else
+                                {'arrow': compare_csv_arrow, 'polars': compare_csv_polars,
+                                 'duckdb': compare_csv_duckdb}[compare_engine])
+            # Arrow kernels release the GIL, so its pairs run on threads without pickling;
+            # Polars and DuckDB already spread each pair over their own thread pools
+            workers = num_processes if compare_streamed is compare_csv_arrow and use_multithreading else 1
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(lambda csv_name: (csv_name,) + tuple(compare_streamed(
+                    csv_name, source1_csv_map[csv_name], source2_csv_map[csv_name])), common_csvs)
+                results = list(tqdm(results, total=len(common_csvs), desc="Comparing CSVs (streamed)", unit="csv",
+                                    file=sys.stdout, dynamic_ncols=True))
+            for csv_name, diff_df, summary in results:
+                if diff_df.empty:
+                    if summary.get('Status') != 'FAIL':
+                        summary['Note'] = '✅ No differences'
+                else:
+                    diff_df['File'] = csv_name
+                    all_diffs.append(diff_df)
+                all_summaries[csv_name] = summary
+        in_memory_csvs = [] if streamed else common_csvs
+
         # Process comparisons in chunks
-        for i in range(0, len(common_csvs), chunk_size):
-            chunk_csvs = common_csvs[i:i + chunk_size]
+        for i in range(0, len(in_memory_csvs), chunk_size):
+            chunk_csvs = in_memory_csvs[i:i + chunk_size]
             logging.info(f"Processing comparison chunk {i // chunk_size + 1} ({len(chunk_csvs)} CSVs)")
 
             # Load the chunk
@@ -633,23 +2887,28 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
 
                 logging.info(f"Processing batch of {len(batch_csvs)} CSVs")
 
-                # Prepare arguments for process_csv_pair
-                process_args = [
-                    (
-                        csv_name,
-                        source1_csv_map,
-                        source2_csv_map,
-                        current_chunk_source1,
-                        current_chunk_source2
-                    )
-                    for csv_name in batch_csvs
-                ]
+                # Prepare arguments for process_csv_pair, one task per key partition of large pairs
+                process_args = []
+                for csv_name in batch_csvs:
+                    if csv_name in large_pairs:
+                        process_args.extend(
+                            ('partition', (csv_name, part, len(large_pairs[csv_name]), df1, df2, original_rows))
+                            for part, (df1, df2, original_rows) in enumerate(large_pairs[csv_name])
+                        )
+                    else:
+                        process_args.append(('pair', (
+                            csv_name,
+                            source1_csv_map,
+                            source2_csv_map,
+                            current_chunk_source1,
+                            current_chunk_source2
+                        )))
 
                 if use_multithreading:  # Interpreted as use_multiprocessing here
-                    with Pool(processes=num_processes) as pool:
+                    with Pool(processes=num_processes, initializer=seed_plan_cache, initargs=(dict(_plan_cache),)) as pool:
                         results = list(tqdm(
-                            pool.imap_unordered(process_csv_pair, process_args),
-                            total=len(batch_csvs),
+                            pool.imap_unordered(process_comparison_task, process_args),
+                            total=len(process_args),
                             desc="Comparing CSVs ",
                             unit="csv",
                             file=sys.stdout,
@@ -657,7 +2916,7 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
                             leave=False
                         ))
                 else:
-                    results = [process_csv_pair(args) for args in tqdm(
+                    results = [process_comparison_task(args) for args in tqdm(
                         process_args,
                         desc="Comparing CSVs",
                         unit="csv",
@@ -665,10 +2924,27 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
                         dynamic_ncols=True
                     )]
 
+                # Merge partition results back into one result per CSV pair
+                partition_results = {}
+                for csv_name, part, diff_df, summary in results:
+                    if part is not None:
+                        partition_results.setdefault(csv_name, []).append((part, diff_df, summary))
+                merged_results = [(csv_name, diff_df, summary) for csv_name, part, diff_df, summary in results
+                                  if part is None]
+                for csv_name, parts in partition_results.items():
+                    parts.sort(key=lambda item: item[0])
+                    part_diffs = [diff_df for _, diff_df, _ in parts if not diff_df.empty]
+                    merged_results.append((
+                        csv_name,
+                        pd.concat(part_diffs, ignore_index=True) if part_diffs else pd.DataFrame(columns=DIFF_COLUMNS),
+                        merge_partition_summaries([summary for _, _, summary in parts])
+                    ))
+
                 # Collect results
-                for csv_name, diff_df, summary in results:
+                for csv_name, diff_df, summary in merged_results:
                     if diff_df.empty:
-                        summary['Note'] = '✅ No differences'
+                        if summary.get('Status') != 'FAIL':
+                            summary['Note'] = '✅ No differences'
                     else:
                         diff_df['File'] = csv_name
                         all_diffs.append(diff_df)
@@ -677,6 +2953,7 @@ def compare_all_csvs(source1_zip_to_csvs, source2_zip_to_csvs, use_multithreadin
             # Clear memory after processing the chunk
             current_chunk_source1.clear()
             current_chunk_source2.clear()
+            large_pairs.clear()
             gc.collect()
 
         if missing_in_source2 and include_missing_files:
@@ -1240,14 +3517,16 @@ def generate_html_report(
     include_passed=True,
     include_missing_files=True,
     include_extra_files=True,
-    use_multithreading=True
+    use_multithreading=True,
+    summary_only=False,
+    row_filter=None
 ):
     report_end_time = datetime.now()
     time_taken = report_end_time - report_start_time
     time_taken_str = str(time_taken).split('.')[0]
 
-    # Precompute filtered DataFrames using groupby
-    file_diff_dfs = dict(tuple(diff_df.groupby('File')))
+    # Precompute filtered DataFrames using groupby (summary_only runs carry no diff records)
+    file_diff_dfs = dict(tuple(diff_df.groupby('File'))) if 'File' in diff_df.columns else {}
     file_diff_dfs = {
         csv_file: df for csv_file, df in file_diff_dfs.items()
         if csv_file not in ["Missing in Source2", "Extra in Source2"]
@@ -1282,7 +3561,7 @@ def generate_html_report(
     required_columns = ['PrimaryKey', 'Status', 'RowNum_Engine', 'RowNum_Neoprice',
                        'Engine_Value', 'Neoprice_Value', 'Column']
     missing_cols = [col for col in required_columns if col not in diff_df.columns]
-    if missing_cols:
+    if missing_cols and not diff_df.empty:
         raise ValueError(f"Missing required columns in diff_df: {missing_cols}")
 
     def process_file(csv_file, file_summary):
@@ -1353,9 +3632,45 @@ def generate_html_report(
                 )
 
         diff_table = "".join(diff_table_rows)
+        diff_header = """
+                                <th width="50%">Primary Key</th>
+                                <th width="10%">Column</th>
+                                <th width="10%">Engine</th>
+                                <th width="10%">Neoprice</th>
+                                <th width="10%">Diff</th>
+                                <th width="10%">Status</th>
+        """
+        diff_note = ""
+        sampled = file_summary.get('Sampled Diff Records')
+        if sampled:
+            diff_note = (
+                f"<div class='smaller-text' style='color: #856404;'>Details sampled: the first {sampled['Kept']} "
+                f"records are listed in full, {sampled['Sampled']} of the {sampled['Past Budget']} records past the "
+                f"detail budget are a uniform random sample. Counts above are exact.</div>"
+            )
+
+        # summary_only runs render per-column tallies instead of diff records
+        if summary_only:
+            column_tallies = file_summary.get('Column Mismatches', {})
+            diff_table = "".join(
+                f"""
+                <tr>
+                    <td><small>{html.escape(str(column))}</small></td>
+                    <td class="numeric-diff"><small>{count}</small></td>
+                </tr>
+                """
+                for column, count in sorted(column_tallies.items(), key=lambda item: -item[1])
+            )
+            diff_header = """
+                                <th width="80%">Column</th>
+                                <th width="20%">Field Mismatches</th>
+            """
+            diff_note = "<div class='smaller-text' style='color: #6c757d;'>Row details not collected (summary_only mode)</div>"
 
         # Build mismatch details
-        xrow_disc = row_discrepancies - (missing_rows + extra_rows + duplicates)
+        rekeyed_rows = file_summary.get('Re-keyed Rows', 0)
+        rule_violations = file_summary.get('Rule Violations in Engine', 0) + file_summary.get('Rule Violations in Neoprice', 0)
+        xrow_disc = row_discrepancies - (missing_rows + extra_rows + duplicates + rekeyed_rows)
         mismatch_details = (
             f"""
             <div>
@@ -1367,17 +3682,15 @@ def generate_html_report(
                     {f"| missing rows:{missing_rows}" if missing_rows > 0 else ""}
                     {f"| extra rows:{extra_rows}" if extra_rows > 0 else ""}
                     {f"| duplicate rows:{duplicates}" if duplicates > 0 else ""}
+                    {f"| re-keyed rows:{rekeyed_rows}" if rekeyed_rows > 0 else ""}
+                    {f"| rule violations:{rule_violations}" if rule_violations > 0 else ""}
                 </span>
                 <div id="diff-{csv_file}" style="display:none; margin-top: 10px;">
+                    {diff_note}
                     <table class="diff-table">
                         <thead>
                             <tr>
-                                <th width="50%">Primary Key</th>
-                                <th width="10%">Column</th>
-                                <th width="10%">Engine</th>
-                                <th width="10%">Neoprice</th>
-                                <th width="10%">Diff</th>
-                                <th width="10%">Status</th>
+                                {diff_header}
                             </tr>
                         </thead>
                         <tbody>
@@ -1608,6 +3921,7 @@ def generate_html_report(
                         <span class="smaller-text">{"All Columns" if not columns else ', '.join(columns)}</span>
                     </span>
                 </li>
+                <li><strong><i class="fas fa-filter"></i> Row Filter:</strong> {html.escape(row_filter) if row_filter else "All Rows"}</li>
             </ul>
             <h2>📝 File Comparison Results</h2>
             <table>
@@ -1651,6 +3965,214 @@ def generate_html_report(
         </html>
         """)
 
+'''-----------------------------------
+Column Profiles
+------------------------------------'''
+def split_column_profiles(diff_df, summary):
+    """{profile name: (diff_df, summary)} from one comparison run with column profiles.
+
+    Each file summary takes the field and row counts of the profile and is
+    finalized again, so status and percentages only reflect its columns.
+    Field records are kept only for the profile's columns; row-level
+    records (missing, extra, duplicate, re-keyed, rule violations) are kept
+    in every profile.
+    """
+    row_level = pd.Series(False, index=diff_df.index)
+    if 'Column' in diff_df.columns:
+        row_level = (diff_df['Column'].isin(['DUPLICATE_ROW', 'MISSING_ROW', 'EXTRA_ROW', 'REKEYED_ROW']) |
+                     diff_df['Status'].astype(str).str.startswith('Rule Violation'))
+    profiles = {}
+    for name, columns in column_profiles.items():
+        profile_summary = {}
+        for csv_file, file_summary in summary.items():
+            if not isinstance(file_summary, dict) or 'Column Profiles' not in file_summary:
+                profile_summary[csv_file] = file_summary
+                continue
+            file_summary = dict(file_summary)
+            file_summary.update(file_summary.pop('Column Profiles')[name])
+            profile_summary[csv_file] = finalize_summary(file_summary)
+        profile_diff_df = diff_df
+        if 'Column' in diff_df.columns:
+            profile_diff_df = diff_df[row_level | diff_df['Column'].isin(columns)]
+        profiles[name] = (profile_diff_df.reset_index(drop=True), profile_summary)
+    return profiles
+
+'''-----------------------------------
+Key Discovery
+------------------------------------'''
+def key_column_codes(df, columns):
+    """{column: cleaned value codes} for the key columns, cleaned like encode_primary_keys"""
+    column_codes = {}
+    for col in columns:
+        codes, cleaned = clean_key_values(df[col])
+        clean_codes, _ = pd.factorize(cleaned)
+        column_codes[col] = clean_codes[codes].astype(np.int64)
+    return column_codes
+
+def fold_key_codes(tuple_codes, codes):
+    """Dense codes of (tuple, value) pairs, extending a key tuple by one column"""
+    return pd.factorize(tuple_codes * (int(codes.max()) + 1) + codes)[0]
+
+def distinct_key_count(column_codes, columns, rows):
+    """Number of distinct value tuples over the given columns"""
+    if rows == 0:
+        return 0
+    tuple_codes = np.zeros(rows, dtype=np.int64)
+    for col in columns:
+        tuple_codes = fold_key_codes(tuple_codes, column_codes[col])
+    return int(tuple_codes.max()) + 1
+
+class KeyProfile:
+    """Key column codes of one Engine/Neoprice CSV pair, both sides stacked.
+
+    A column subset gives the same matching as the full key when it splits
+    the stacked rows into as many distinct tuples as the full key does: being
+    a subset, its groups can only merge key groups, never split them, so equal
+    counts mean equal groups within each file and across the two files.
+    """
+    def __init__(self, file_name, column_codes, rows):
+        self.file_name = file_name
+        self.column_codes = column_codes
+        self.rows = rows
+        self.target = distinct_key_count(column_codes, csv_primary_keys, rows)
+
+    @classmethod
+    def from_pair(cls, file_name, df1, df2):
+        stacked = pd.concat([df1[csv_primary_keys], df2[csv_primary_keys]], ignore_index=True)
+        return cls(file_name, key_column_codes(stacked, csv_primary_keys), len(stacked))
+
+    def sample(self, sample_rows):
+        """Profile of a uniform row sample, or self when the pair is small enough"""
+        if self.rows <= sample_rows:
+            return self
+        rows = np.sort(np.random.default_rng(0).choice(self.rows, sample_rows, replace=False))
+        return KeyProfile(self.file_name, {col: codes[rows] for col, codes in self.column_codes.items()}, sample_rows)
+
+    def deficit(self, columns):
+        """Key groups that the column subset merges together"""
+        return self.target - distinct_key_count(self.column_codes, columns, self.rows)
+
+def find_minimal_key(profiles, candidates):
+    """Smallest column subset that splits every profile like the full key.
+
+    Subsets of up to key_discovery_exhaustive_size columns are tried
+    exhaustively, most selective first; past that the key is grown greedily
+    by the column that merges the fewest key groups, then pruned of any
+    column it no longer needs.
+    """
+    for size in range(1, min(key_discovery_exhaustive_size, len(candidates)) + 1):
+        for columns in combinations(candidates, size):
+            if all(profile.deficit(columns) == 0 for profile in profiles):
+                return list(columns)
+
+    # Greedy growth keeps each profile's tuple codes for the chosen prefix
+    chosen = []
+    tuple_codes = [np.zeros(profile.rows, dtype=np.int64) for profile in profiles]
+    while any(profile.target > (int(codes.max()) + 1 if profile.rows else 0) for profile, codes in zip(profiles, tuple_codes)):
+        best, best_count = None, -1
+        for col in candidates:
+            if col in chosen:
+                continue
+            trial = [fold_key_codes(codes, profile.column_codes[col]) for profile, codes in zip(profiles, tuple_codes)]
+            count = sum(int(codes.max()) + 1 for codes in trial if len(codes))
+            if count > best_count:
+                best, best_count, best_codes = col, count, trial
+        if best is None:
+            return None
+        chosen.append(best)
+        tuple_codes = best_codes
+    for col in reversed(chosen[:-1]):
+        reduced = [c for c in chosen if c != col]
+        if all(profile.deficit(reduced) == 0 for profile in profiles):
+            chosen = reduced
+    return chosen
+
+def key_build_seconds(df, columns):
+    """Time to clean and hash the key columns of df, as compare_csvs does per row"""
+    start = time.perf_counter()
+    cleaned = {}
+    for col in columns:
+        codes, values = clean_key_values(df[col])
+        cleaned[col] = values[codes]
+    pd.util.hash_pandas_object(pd.DataFrame(cleaned), index=False)
+    return time.perf_counter() - start
+
+def load_key_discovery_pairs(download_local):
+    """Yield (file_name, df1, df2) for up to key_discovery_sample_files CSV pairs present in both sources"""
+    sides = []
+    for prefix in (source_1_prefix, source_2_prefix):
+        members = {}
+        for zip_key in list_zip_files(prefix, download_local):
+            for csv_name in list_csvs_in_zip(zip_key, download_local):
+                members.setdefault(normalize_filename(csv_name), (zip_key, csv_name))
+        sides.append(members)
+    for file_name in sorted(set(sides[0]) & set(sides[1]))[:key_discovery_sample_files]:
+        df1 = read_csv_from_zip(*sides[0][file_name], download_local)
+        df2 = read_csv_from_zip(*sides[1][file_name], download_local)
+        if df1 is None or df2 is None:
+            continue
+        missing = [key for key in csv_primary_keys if key not in df1.columns or key not in df2.columns]
+        if missing:
+            logging.warning(f"Key discovery skips {file_name}: missing key columns {missing}")
+            continue
+        yield file_name, df1, df2
+
+def discover_primary_key(download_local=True):
+    """Profile sample CSV pairs from both sources and suggest a cheaper primary key.
+
+    The search runs on row samples of each pair; the suggestion is then
+    verified on the complete pairs, and any pair it fails on joins the
+    search set until a key holds on all of them. Returns the suggested key
+    columns in canonical order (most selective first), or None.
+    """
+    profiles, timing_pair = [], None
+    for file_name, df1, df2 in load_key_discovery_pairs(download_local):
+        profiles.append(KeyProfile.from_pair(file_name, df1, df2))
+        if timing_pair is None:
+            timing_pair = pd.concat([df1[csv_primary_keys], df2[csv_primary_keys]], ignore_index=True)
+        del df1, df2
+        gc.collect()
+    if not profiles:
+        thread_safe_print("❌ Key discovery found no CSV present in both sources")
+        logging.error("Key discovery found no CSV present in both sources")
+        return None
+
+    # Most selective first; columns constant across every pair never help
+    selectivity = {col: sum(len(np.unique(p.column_codes[col])) / p.rows for p in profiles if p.rows) for col in csv_primary_keys}
+    candidates = sorted((col for col in csv_primary_keys if any(len(np.unique(p.column_codes[col])) > 1 for p in profiles)),
+                        key=lambda col: -selectivity[col])
+
+    search_set = [profile.sample(key_discovery_sample_rows) for profile in profiles]
+    while True:
+        suggestion = find_minimal_key(search_set, candidates)
+        if suggestion is None:
+            break
+        failed = [profile for profile in profiles if profile.deficit(suggestion)]
+        if not failed:
+            break
+        logging.info(f"Key discovery: {suggestion} fails verification on {[p.file_name for p in failed]}, searching again")
+        search_set += failed  # Their samples stay first, they reject most subsets cheaply
+
+    canonical_order = sorted(csv_primary_keys, key=lambda col: -selectivity[col])
+    for profile in profiles:
+        if profile.target < profile.rows:
+            logging.info(f"Key discovery: {profile.file_name} has {profile.rows - profile.target} duplicate key rows, kept as duplicates by the suggestion")
+
+    if suggestion is None or len(suggestion) == len(csv_primary_keys):
+        thread_safe_print("🔑 Key discovery: no smaller key gives the same matching; canonical key order (most selective first):")
+        thread_safe_print(f"   primary_key_columns = {','.join(canonical_order)}")
+        return canonical_order
+
+    suggestion = sorted(suggestion, key=lambda col: -selectivity[col])
+    full_seconds = key_build_seconds(timing_pair, csv_primary_keys)
+    suggested_seconds = key_build_seconds(timing_pair, suggestion)
+    thread_safe_print(f"🔑 Key discovery: {len(suggestion)} of {len(csv_primary_keys)} key columns give the same matching on "
+                      f"{len(profiles)} verified CSV pairs ({sum(p.rows for p in profiles)} rows)")
+    thread_safe_print(f"   primary_key_columns = {','.join(suggestion)}")
+    thread_safe_print(f"   key build time on {len(timing_pair)} rows: {full_seconds:.3f}s -> {suggested_seconds:.3f}s")
+    thread_safe_print(f"   canonical full key order: {','.join(canonical_order)}")
+    return suggestion
+
 '''-----------------------------------
 Main Execution Functions
 ------------------------------------'''
@@ -1714,27 +4236,44 @@ if __name__ == "__main__":
         create_dir(output_dir)
         output_file = os.path.join(output_dir, output_file)
 
+        if key_discovery:
+            logging.info('---------------- Key Discovery Started ----------------')
+            discover_primary_key(download_local=download_local)
+            logging.info('---------------- Key Discovery Finished ----------------')
+            sys.exit(0)
+
         logging.info('---------------- CSV Comparison Started ----------------')
         start_time = datetime.now()
         diff_df, summary, list_files = run_comparison(download_local=download_local)
-        
-        generate_html_report(
-            diff_df=diff_df,
-            summary=summary,
-            report_start_time=start_time,
-            output_file=output_file,
-            source_files_count=list_files[0],
-            destination_files_count=list_files[1],
-            primary_key_columns=csv_primary_keys,
-            columns=csv_columns,
-            project_name=project_name,
-            project_logo=project_logo,
-            include_passed=include_passed,
-            include_missing_files=include_missing_files,
-            include_extra_files=include_extra_files,
-            # global_percentage=global_percentage,
-            use_multithreading=True
-        )
+
+        # One report per column profile, all from the same comparison run
+        reports = {None: (diff_df, summary)}
+        if column_profiles:
+            reports = split_column_profiles(diff_df, summary)
+        for profile, (report_diff_df, report_summary) in reports.items():
+            report_file = output_file
+            if profile is not None:
+                report_base, report_ext = os.path.splitext(output_file)
+                report_file = f"{report_base}_{profile}{report_ext}"
+            generate_html_report(
+                diff_df=report_diff_df,
+                summary=report_summary,
+                report_start_time=start_time,
+                output_file=report_file,
+                source_files_count=list_files[0],
+                destination_files_count=list_files[1],
+                primary_key_columns=csv_primary_keys,
+                columns=column_profiles[profile] if profile is not None else csv_columns,
+                project_name=project_name if profile is None else f"{project_name} - {profile}",
+                project_logo=project_logo,
+                include_passed=include_passed,
+                include_missing_files=include_missing_files,
+                include_extra_files=include_extra_files,
+                # global_percentage=global_percentage,
+                use_multithreading=True,
+                summary_only=summary_only,
+                row_filter=row_filter
+            )
 
         
         
@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import shutil
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def compare_module(tmp_path_factory):
+    """Final_code_v1 imported from a scratch directory, so its config is read there and its log lands there"""
+    work_dir = tmp_path_factory.mktemp('compare')
+    shutil.copy(os.path.join(REPO_DIR, 'config.ini'), work_dir)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        spec = importlib.util.spec_from_file_location('Final_code_v1', os.path.join(REPO_DIR, 'Final_code_v1.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
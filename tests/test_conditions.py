@@ -0,0 +1,49 @@
+import pandas as pd
+
+
+def fares():
+    return pd.DataFrame({
+        'Total Price AMT': [10889, 5668.0, 7.5, None],
+        'Fare AMT': ['5668', '5668', '9', '1'],
+        'Fare Class': ['Y', 'Y', '100', 'B'],
+        'PTC': ['ADT', 'ADT', None, 'CNN'],
+    })
+
+
+def test_row_filter_orders_columns_as_numbers(compare_module):
+    mask = compare_module.RowFilter('`Total Price AMT` > `Fare AMT`').mask(fares())
+    assert mask.tolist() == [True, False, False, False]
+
+
+def test_row_filter_equates_columns_as_numbers(compare_module):
+    mask = compare_module.RowFilter('`Total Price AMT` == `Fare AMT`').mask(fares())
+    assert mask.tolist() == [False, True, False, False]
+
+
+def test_row_filter_compares_text_literals_as_text(compare_module):
+    mask = compare_module.RowFilter('`Fare Class` == "Y"').mask(fares())
+    assert mask.tolist() == [True, True, False, False]
+
+
+def test_row_filter_rejects_empty_cells(compare_module):
+    mask = compare_module.RowFilter('`PTC` != "ADT"').mask(fares())
+    assert mask.tolist() == [False, False, False, True]
+
+
+def test_consistency_rule_orders_columns_as_numbers(compare_module):
+    rule = compare_module.ConsistencyRule('ge', '`Total Price AMT` >= `Fare AMT` when `PTC` == "ADT"')
+    positions, _ = rule.violations(fares())
+    assert positions.tolist() == []
+
+
+def test_consistency_rule_equality_is_numeric_within_tolerance(compare_module):
+    rule = compare_module.ConsistencyRule('eq', '`Total Price AMT` == `Fare AMT`')
+    positions, details = rule.violations(fares())
+    assert positions.tolist() == [0, 2]
+    assert details[0] == '10889.0 != 5668'
+
+
+def test_consistency_rule_condition_skips_empty_cells(compare_module):
+    rule = compare_module.ConsistencyRule('cnn', '`Fare AMT` == 1 when `PTC` != "ADT"')
+    positions, _ = rule.violations(fares())
+    assert positions.tolist() == []